@@ -1,13 +1,23 @@
 import os
 import json
+import orjson
+import functools
+import logging
+import threading
 from enum import StrEnum
-from typing import Literal, Union, List
-from pydantic import BaseModel, Field
-from openai import OpenAI
+from types import MappingProxyType
+from typing import Annotated, Literal, Optional, Union, List
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, field_validator
+from pydantic.json_schema import GenerateJsonSchema, DEFAULT_REF_TEMPLATE
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
+from cachetools import LRUCache
+from services.http_clients import get_http_client, get_async_http_client
 
 load_dotenv(override=True)
 
+logger = logging.getLogger(__name__)
+
 # ==========================================
 # 1. CATEGORICAL ENUMS (FULLY POPULATED)
 # ==========================================
@@ -22,19 +32,30 @@ class Region(StrEnum):
     SE="se"; SG="sg"; SR="sr"; SW="sw"; TH="th"; TR="tr"; TW="tw"; US="us"
     VE="ve"; VN="vn"; ZA="za"
 
-class Exchange(StrEnum):
-    BUE="BUE"; VIE="VIE"; ASX="ASX"; BRU="BRU"; SAO="SAO"; CNQ="CNQ"; NEO="NEO"
-    TOR="TOR"; VAN="VAN"; EBS="EBS"; SGO="SGO"; SHH="SHH"; SHZ="SHZ"; BVC="BVC"
-    PRA="PRA"; BER="BER"; DUS="DUS"; FRA="FRA"; GER="GER"; HAM="HAM"; MUN="MUN"
-    STU="STU"; CPH="CPH"; TAL="TAL"; CAI="CAI"; MCE="MCE"; HEL="HEL"; PAR="PAR"
-    AQS="AQS"; IOB="IOB"; LSE="LSE"; ATH="ATH"; HKG="HKG"; BUD="BUD"; JKT="JKT"
-    ISE="ISE"; TLV="TLV"; BSE="BSE"; NSI="NSI"; ICE="ICE"; MIL="MIL"; FKA="FKA"
-    JPX="JPX"; SAP="SAP"; KOE="KOE"; KSC="KSC"; KUW="KUW"; LIT="LIT"; RIS="RIS"
-    MEX="MEX"; KLS="KLS"; AMS="AMS"; OSL="OSL"; NZE="NZE"; PHP="PHP"; PHS="PHS"
-    WSE="WSE"; LIS="LIS"; DOH="DOH"; BVB="BVB"; SAU="SAU"; STO="STO"; SES="SES"
-    SET="SET"; IST="IST"; TAI="TAI"; TWO="TWO"; ASE="ASE"; BTS="BTS"; CXI="CXI"
-    NCM="NCM"; NGM="NGM"; NMS="NMS"; NYQ="NYQ"; OEM="OEM"; OQB="OQB"; OQX="OQX"
-    PCX="PCX"; PNK="PNK"; YHD="YHD"; CCS="CCS"; JNB="JNB"
+# Exchange is not referenced by any filter model, so it is only built on first access
+_EXCHANGE_VALUES = (
+    "BUE", "VIE", "ASX", "BRU", "SAO", "CNQ", "NEO",
+    "TOR", "VAN", "EBS", "SGO", "SHH", "SHZ", "BVC",
+    "PRA", "BER", "DUS", "FRA", "GER", "HAM", "MUN",
+    "STU", "CPH", "TAL", "CAI", "MCE", "HEL", "PAR",
+    "AQS", "IOB", "LSE", "ATH", "HKG", "BUD", "JKT",
+    "ISE", "TLV", "BSE", "NSI", "ICE", "MIL", "FKA",
+    "JPX", "SAP", "KOE", "KSC", "KUW", "LIT", "RIS",
+    "MEX", "KLS", "AMS", "OSL", "NZE", "PHP", "PHS",
+    "WSE", "LIS", "DOH", "BVB", "SAU", "STO", "SES",
+    "SET", "IST", "TAI", "TWO", "ASE", "BTS", "CXI",
+    "NCM", "NGM", "NMS", "NYQ", "OEM", "OQB", "OQX",
+    "PCX", "PNK", "YHD", "CCS", "JNB",
+)
+
+@functools.cache
+def _exchange_enum() -> type[StrEnum]:
+    return StrEnum("Exchange", [(v, v) for v in _EXCHANGE_VALUES])
+
+def __getattr__(name: str):
+    if name == "Exchange":
+        return _exchange_enum()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 class Sector(StrEnum):
     BASIC_MATERIALS = "Basic Materials"
@@ -312,6 +333,22 @@ class PeerGroup(StrEnum):
     US_FUND_TRADING_LEVERAGED_EQUITY = "US Fund Trading–Leveraged Equity"
     UTILITIES = "Utilities"
 
+def _normalize(value: str) -> str:
+    # Case and whitespace insensitive key, e.g. " Banks  Regional" -> "banks regional"
+    return " ".join(value.split()).lower()
+
+# Direct normalized value -> member lookups, so filter validation skips Enum.__call__
+REGION_MAP = MappingProxyType({_normalize(m.value): m for m in Region})
+SECTOR_MAP = MappingProxyType({_normalize(m.value): m for m in Sector})
+INDUSTRY_MAP = MappingProxyType({_normalize(m.value): m for m in Industry})
+PEER_GROUP_MAP = MappingProxyType({_normalize(m.value): m for m in PeerGroup})
+
+def _lookup_member(mapping: MappingProxyType, value):
+    # Unknown values fall through so Pydantic still reports the usual enum error
+    if isinstance(value, str):
+        return mapping.get(_normalize(value), value)
+    return value
+
 # ==========================================
 # 2. NUMERIC KEY ENUM (FULLY POPULATED)
 # ==========================================
@@ -428,103 +465,307 @@ class NumericField(StrEnum):
 
 class OperationEnum(StrEnum):
     EQUALS = "equals"
-    GREATER_THAN = "greater  than"
+    GREATER_THAN = "greater than"
     LESS_THAN = "less than"
     GREATER_THAN_OR_EQUAL_TO = "greater than or equal to"
     LESS_THAN_OR_EQUAL_TO = "less than or equal to"
     IS_IN_LIST  = "is-in"
     BETWEEN = "between two values"
 
-class RegionFilter(BaseModel):
+_OPERATION_ALIASES = {
+    OperationEnum.EQUALS: ("=", "==", "eq", "equal", "equal to", "is"),
+    OperationEnum.GREATER_THAN: (">", "gt", "above", "over", "more than", "higher than"),
+    OperationEnum.LESS_THAN: ("<", "lt", "below", "under", "lower than"),
+    OperationEnum.GREATER_THAN_OR_EQUAL_TO: (">=", "gte", "at least"),
+    OperationEnum.LESS_THAN_OR_EQUAL_TO: ("<=", "lte", "at most"),
+    OperationEnum.IS_IN_LIST: ("in", "is in", "is in list"),
+    OperationEnum.BETWEEN: ("between", "btwn"),
+}
+
+# Normalizing also folds the old "greater  than" (double space) value onto GREATER_THAN
+OPERATION_MAP = MappingProxyType({
+    **{_normalize(alias): op for op, aliases in _OPERATION_ALIASES.items() for alias in aliases},
+    **{_normalize(m.value): m for m in OperationEnum},
+})
+
+class _FilterBase(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='forbid')
+
+    @field_validator("operation", mode="before", check_fields=False)
+    @classmethod
+    def _lookup_operation(cls, v):
+        return _lookup_member(OPERATION_MAP, v)
+
+class RegionFilter(_FilterBase):
     filterName: Literal["region"]
     filterCategory: Literal["region"] = "region"
     filterValue: Region 
     operation: OperationEnum
 
-class SectorFilter(BaseModel):
+    @field_validator("filterValue", mode="before")
+    @classmethod
+    def _lookup_value(cls, v):
+        return _lookup_member(REGION_MAP, v)
+
+class SectorFilter(_FilterBase):
     filterName: Literal["sector"]
     filterCategory: Literal["sector"] = "sector"
     filterValue: Sector 
     operation: OperationEnum
 
-class IndustryFilter(BaseModel):
+    @field_validator("filterValue", mode="before")
+    @classmethod
+    def _lookup_value(cls, v):
+        return _lookup_member(SECTOR_MAP, v)
+
+class IndustryFilter(_FilterBase):
     filterName: Literal["industry"]
     filterCategory: Literal["industry"] = "industry"
     filterValue: Industry 
     operation: OperationEnum
 
-class PeerGroupFilter(BaseModel):
+    @field_validator("filterValue", mode="before")
+    @classmethod
+    def _lookup_value(cls, v):
+        return _lookup_member(INDUSTRY_MAP, v)
+
+class PeerGroupFilter(_FilterBase):
     filterName: Literal["peer_group"]
     filterCategory: Literal["peer_group"] = "peer_group"
     filterValue: PeerGroup
     operation: OperationEnum
 
-class NumericFilter(BaseModel):
+    @field_validator("filterValue", mode="before")
+    @classmethod
+    def _lookup_value(cls, v):
+        return _lookup_member(PEER_GROUP_MAP, v)
+
+class NumericFilter(_FilterBase):
     filterName: NumericField
-    filterCategory: str
+    filterCategory: Literal["numeric"] = "numeric"
     filterValue: str
     operation: OperationEnum
 
-# Union to enforce schema choice
-FilterObject = Union[
-    RegionFilter, 
-    SectorFilter, 
-    IndustryFilter, 
-    PeerGroupFilter, 
-    NumericFilter
+# Tagged union: Pydantic dispatches on filterCategory instead of trying each model
+FilterObject = Annotated[
+    Union[
+        RegionFilter, 
+        SectorFilter, 
+        IndustryFilter, 
+        PeerGroupFilter, 
+        NumericFilter
+    ],
+    Field(discriminator="filterCategory")
 ]
 
+class _AnyOfJsonSchema(GenerateJsonSchema):
+    """
+    Structured outputs reject `oneOf`/`discriminator`, so tagged unions are
+    emitted as a plain `anyOf` (each variant still pins its filterCategory).
+    """
+    def tagged_union_schema(self, schema):
+        json_schema = super().tagged_union_schema(schema)
+        json_schema["anyOf"] = json_schema.pop("oneOf")
+        json_schema.pop("discriminator", None)
+        return json_schema
+
 class AgentFilterResponse(BaseModel):
     filters: List[FilterObject]
     sqlQuery: str
 
+    @classmethod
+    def model_json_schema(cls, by_alias=True, ref_template=DEFAULT_REF_TEMPLATE, schema_generator=_AnyOfJsonSchema, mode="validation", **kwargs):
+        return super().model_json_schema(by_alias=by_alias, ref_template=ref_template, schema_generator=schema_generator, mode=mode, **kwargs)
+
 class StockMarket(StrEnum):
     US = "US"
     SA = "SR"
 
+# Built once so every response goes through the same compiled validator
+RESPONSE_ADAPTER = TypeAdapter(AgentFilterResponse)
+
+def _strict_json_schema(schema: dict, root: Optional[dict] = None) -> dict:
+    """
+    Rewrites a Pydantic JSON schema in place into the subset OpenAI's strict
+    structured outputs accept: every object closed (additionalProperties: false)
+    with all of its properties required, no null defaults, single-entry allOf
+    merged, and $refs that carry sibling keys inlined.
+    """
+    root = schema if root is None else root
+    for defs_key in ("$defs", "definitions"):
+        for definition in schema.get(defs_key, {}).values():
+            _strict_json_schema(definition, root)
+
+    if schema.get("type") == "object":
+        schema.setdefault("additionalProperties", False)
+    properties = schema.get("properties")
+    if isinstance(properties, dict):
+        schema["required"] = list(properties)
+        schema["properties"] = {key: _strict_json_schema(prop, root) for key, prop in properties.items()}
+    if isinstance(schema.get("items"), dict):
+        schema["items"] = _strict_json_schema(schema["items"], root)
+    if isinstance(schema.get("anyOf"), list):
+        schema["anyOf"] = [_strict_json_schema(variant, root) for variant in schema["anyOf"]]
+
+    all_of = schema.get("allOf")
+    if isinstance(all_of, list):
+        if len(all_of) == 1:
+            schema.update(_strict_json_schema(all_of[0], root))
+            schema.pop("allOf")
+        else:
+            schema["allOf"] = [_strict_json_schema(entry, root) for entry in all_of]
+
+    if "default" in schema and schema["default"] is None:
+        schema.pop("default")
+
+    ref = schema.get("$ref")
+    if ref and len(schema) > 1:
+        resolved = root
+        for key in ref.removeprefix("#/").split("/"):
+            resolved = resolved[key]
+        # Keys next to the $ref win over the referenced definition
+        schema.update({**resolved, **schema})
+        schema.pop("$ref")
+        return _strict_json_schema(schema, root)
+    return schema
+
+# The structured-output spec never changes, so derive the strict JSON schema once
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "AgentFilterResponse",
+        "schema": _strict_json_schema(AgentFilterResponse.model_json_schema()),
+        "strict": True,
+    },
+}
+
 # ==========================================
 # 4. AGENT LOGIC
 # ==========================================
 
+@functools.lru_cache(maxsize=1)
+def _derive_fields() -> dict:
+    """
+    Builds the prompt's field catalogue from the enums above, so it can never
+    drift from what the response schema accepts.
+    """
+    return {
+        "regions": [m.value for m in Region],
+        "sectors": [m.value for m in Sector],
+        "industries": [m.value for m in Industry],
+        "peer_groups": [m.value for m in PeerGroup],
+        "numeric": [m.value for m in NumericField],
+    }
+
+@functools.lru_cache(maxsize=None)
+def _load_fields(path: str) -> dict:
+    # Read an override file once per process rather than once per agent
+    with open(path, "r") as f:
+        return json.load(f)
+
 class NLPToFilterAgent:
     def __init__(self) -> None:
-        self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        # Long-lived HTTP/2 pools so bursts of requests share connections and TLS sessions
+        self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), http_client=get_http_client())
+        self.async_client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"), http_client=get_async_http_client())
+        # (model, market, query) -> validated response as JSON bytes, so every hit hands
+        # back a fresh object; the sync entry points may run on worker threads, hence the lock
+        self.cache: LRUCache = LRUCache(maxsize=int(os.environ.get("FILTER_CACHE_SIZE", "256")))
+        self._cache_lock = threading.Lock()
+        self._model = os.environ.get("OPENAI_MODEL", "gpt-4o")
+        # The market hint lives in the system message, so each market has one fixed message
+        system_prompt = "You are an expert financial analyst. Convert the user's NLP query into strict database filters using the specific Enums provided in the schema."
+        self._system_msgs = {
+            StockMarket.US: {"role": "system", "content": system_prompt + "\nNote: Focus on stocks listed in the US market."},
+            StockMarket.SA: {"role": "system", "content": system_prompt + "\nNote: Focus on stocks listed in the Saudi Arabian market."},
+        }
         self.prompt_path = os.environ.get("FILTER_AGENT_PROMPT_PATH")
-        # Load JSON for context if needed, though types are now handled in code
+        # The enums are the source of truth; the JSON file is only an optional override
+        fields_override = os.environ.get("EXPECTED_FILTER_FIELDS_JSON")
         try:
-            with open(os.environ.get("EXPECTED_FILTER_FIELDS_JSON"), "r") as f:
-                self.json_entries = json.load(f)
-        except:
-             self.json_entries = {}
-    
-    def _build_prompt(self, nlp_input: str) -> str:
+            self.json_entries = _load_fields(fields_override) if fields_override else _derive_fields()
+        except (OSError, ValueError):
+            self.json_entries = _derive_fields()
+
+        # Template and fields never change after init, so read/serialize them once
         try:
             with open(self.prompt_path, "r") as file:
-                template = file.read()
-        except FileNotFoundError:
+                self._template = file.read()
+        except (FileNotFoundError, TypeError):
              # Fallback if file missing for testing
-             template = "Map this user query to filters: {nlp_input}. Use the valid fields provided: {fields}"
-            
-        return template.replace("{fields}", json.dumps(self.json_entries)).replace("{nlp_input}", nlp_input)
+             self._template = "Use the valid fields provided: {fields}. Map this user query to filters: {nlp_input}"
+        # Static content must be byte-identical across calls and come before the user
+        # input, so OpenAI can reuse its cached prompt prefix
+        self._fields_json = orjson.dumps(self.json_entries, option=orjson.OPT_SORT_KEYS).decode()
+        # Fields are static, so substitute them now and pre-split around the user input
+        self._prompt_parts = self._template.replace("{fields}", self._fields_json).split("{nlp_input}")
+    
+    def _build_prompt(self, nlp_input: str) -> str:
+        return nlp_input.join(self._prompt_parts)
 
-    def filter_stocks(self, nlp_input: str, market: StockMarket= StockMarket.US) -> dict:
-        final_prompt = self._build_prompt(nlp_input)
-        
-        if market == StockMarket.SA:
-            final_prompt += "\nNote: Focus on stocks listed in the Saudi Arabian market."
-        elif market == StockMarket.US:
-            final_prompt += "\nNote: Focus on stocks listed in the US market."
+    def _request(self, nlp_input: str, market: StockMarket) -> tuple[tuple, dict]:
+        """
+        Returns the cache key and the OpenAI request kwargs for a query.
+        """
+        system_msg = self._system_msgs[market]
 
-        response = self.client.beta.chat.completions.parse(
-            model=os.environ.get("OPENAI_MODEL", "gpt-4o"),
+        # Identical queries parse to identical filters, so repeats can skip the round trip
+        # (the system message is fixed per market, so the market stands in for it)
+        cache_key = (self._model, market, nlp_input)
+
+        return cache_key, dict(
+            model=self._model,
             messages=[
-                {"role": "system", "content": "You are an expert financial analyst. Convert the user's NLP query into strict database filters using the specific Enums provided in the schema."},
-                {"role": "user", "content": final_prompt}
+                system_msg,
+                {"role": "user", "content": self._build_prompt(nlp_input)}
             ],
-            response_format=AgentFilterResponse
+            response_format=RESPONSE_FORMAT
         )
-        
-        return response.choices[0].message.parsed.model_dump(mode="json", exclude_none=True)
+
+    @staticmethod
+    def _log_usage(usage) -> None:
+        details = getattr(usage, "prompt_tokens_details", None) if usage else None
+        if details is not None:
+            logger.debug("Filter prompt tokens: %s (cached: %s)", usage.prompt_tokens, details.cached_tokens)
+
+    def _cached(self, cache_key: tuple) -> Optional[bytes]:
+        with self._cache_lock:
+            return self.cache.get(cache_key)
+
+    def _store(self, cache_key: tuple, content: str) -> bytes:
+        # Serialize straight to JSON bytes with pydantic-core, no intermediate dict
+        parsed = RESPONSE_ADAPTER.validate_json(content)
+        result = parsed.model_dump_json(exclude_none=True).encode()
+        with self._cache_lock:
+            self.cache[cache_key] = result
+        return result
+
+    def filter_stocks_json(self, nlp_input: str, market: StockMarket = StockMarket.US) -> bytes:
+        """
+        Same as filter_stocks, but returns the response as UTF-8 JSON bytes for
+        callers that pass it straight on (e.g. an HTTP response body).
+        """
+        cache_key, request = self._request(nlp_input, market)
+        cached = self._cached(cache_key)
+        if cached is not None:
+            return cached
+
+        response = self.client.chat.completions.create(**request)
+        self._log_usage(response.usage)
+        return self._store(cache_key, response.choices[0].message.content)
+
+    def filter_stocks(self, nlp_input: str, market: StockMarket= StockMarket.US) -> dict:
+        return orjson.loads(self.filter_stocks_json(nlp_input, market))
+
+    async def filter_stocks_async(self, nlp_input: str, market: StockMarket = StockMarket.US) -> dict:
+        cache_key, request = self._request(nlp_input, market)
+        cached = self._cached(cache_key)
+        if cached is not None:
+            return orjson.loads(cached)
+
+        response = await self.async_client.chat.completions.create(**request)
+        self._log_usage(response.usage)
+        return orjson.loads(self._store(cache_key, response.choices[0].message.content))
 
 # ==========================================
 # 5. EXECUTION
@@ -1,14 +1,21 @@
 import os
-import yfinance as yf
+import asyncio
+import logging
 from pydantic import BaseModel
-from openai import OpenAI
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from enum import StrEnum
 from decimal import Decimal
+from cachetools import TTLCache
+from services import yf_batch
+from services.coalesce import coalesce
+from services.http_clients import get_async_http_client
 
 # Load environment variables
 load_dotenv(override=True)
 
+logger = logging.getLogger(__name__)
+
 # --- 1. Define Pydantic Models (The "Shape" of the output) ---
 class StockKeyFinancials(BaseModel):
     revenue_yoy_growth: float
@@ -51,20 +58,37 @@ class StockMarket(StrEnum):
     SA = "SR"
 
 # --- 2. The Logic Class ---
+ANALYSIS_MODEL = "gpt-4o-2024-08-06"  # Must use a model that supports structured outputs
+ANALYSIS_CACHE_VERSION = "v1"  # Bump when the prompt or result shape changes
+
+# Analyses are reused for a while (default 15 min) so repeat tickers skip yfinance and OpenAI.
+# Stored as JSON bytes, so every hit validates into a fresh result
+_analysis_cache: TTLCache = TTLCache(
+    maxsize=int(os.environ.get("ANALYSIS_CACHE_SIZE", "256")),
+    ttl=float(os.environ.get("ANALYSIS_CACHE_TTL", "900")),
+)
+
 class StockAnalyzer:    
     def __init__(self) -> None:
-        self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        # Shares the process-wide connection pool with the filter agent
+        self.client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"), http_client=get_async_http_client())
         self.prompt_path = os.environ.get("STOCK_ANALYZER_PROMPT_PATH", "stock_analyzer_prompt.txt")
+        # The template never changes, so read it once and pre-split it around the placeholders
+        try:
+            with open(self.prompt_path, "r") as file:
+                template = file.read()
+            self._prompt_parts = [part.split("{ticker}") for part in template.split("{financial_context}")]
+        except FileNotFoundError:
+            self._prompt_parts = None
     
-    def fetch_real_data(self, ticker: str, market: StockMarket= StockMarket.US) -> dict:
+    async def fetch_real_data(self, ticker: str, market: StockMarket= StockMarket.US) -> dict:
         """
         Fetches live data from Yahoo Finance to inject into the prompt.
         """
         if market == StockMarket.SA:
             ticker = f"{ticker}.{market.value}"
-        print(f"Fetching live data for {ticker}...")
-        stock = yf.Ticker(ticker)
-        info = stock.info
+        logger.debug("Fetching live data for %s", ticker)
+        info = await yf_batch.get_info(ticker)
         
         # safely get data with defaults to prevent errors if keys are missing
         data = {
@@ -88,28 +112,34 @@ class StockAnalyzer:
         """
         Reads the template and replaces placeholders with REAL data.
         """
-        try:
-            with open(self.prompt_path, "r") as file:
-                template = file.read()
-        except FileNotFoundError:
+        if self._prompt_parts is None:
             raise FileNotFoundError(f"Prompt file not found at {self.prompt_path}")
-            
+
         # Convert dictionary to a string for the AI to read
-        context_str = "\n".join([f"{k}: {v}" for k, v in financial_data.items()])
-        
-        return template.replace("{ticker}", ticker).replace("{financial_context}", context_str)
+        context_str = "\n".join(f"{k}: {v}" for k, v in financial_data.items())
+
+        return context_str.join(ticker.join(parts) for parts in self._prompt_parts)
+
+    async def analyze_stock(self, ticker: str, market: StockMarket = StockMarket.US) -> StockAnalysisResult:
+        cache_key = (ANALYSIS_CACHE_VERSION, market, ticker.upper(), ANALYSIS_MODEL, self.prompt_path)
+        cached = _analysis_cache.get(cache_key)
+        if cached is not None:
+            return StockAnalysisResult.model_validate_json(cached)
+
+        # Concurrent requests for the same ticker share one upstream call
+        return await coalesce(("analysis", cache_key), lambda: self._analyze(ticker, market, cache_key))
 
-    def analyze_stock(self, ticker: str, market: StockMarket = StockMarket.US) -> StockAnalysisResult:
+    async def _analyze(self, ticker: str, market: StockMarket, cache_key: tuple) -> StockAnalysisResult:
         # 1. Get the Raw Data
-        raw_data = self.fetch_real_data(ticker, market)
+        raw_data = await self.fetch_real_data(ticker, market)
         
         # 2. Construct the Prompt with that data
         final_prompt = self._build_prompt(ticker, raw_data)
         
         # 3. Call OpenAI with Structured Outputs
-        print("Analyzing with AI...")
-        completion = self.client.beta.chat.completions.parse(
-            model="gpt-4o-2024-08-06",  # Must use a model that supports structured outputs
+        logger.debug("Analyzing %s with AI", ticker)
+        completion = await self.client.beta.chat.completions.parse(
+            model=ANALYSIS_MODEL,
             messages=[
                 {"role": "system", "content": "You are a helpful financial analyst assistant."},
                 {"role": "user", "content": final_prompt}
@@ -117,14 +147,16 @@ class StockAnalyzer:
             response_format=StockAnalysisResult,
         )
         
-        return completion.choices[0].message.parsed
+        result = completion.choices[0].message.parsed
+        _analysis_cache[cache_key] = result.model_dump_json().encode()
+        return result
 
 # --- 3. Execution ---
 if __name__ == "__main__":
     analyzer = StockAnalyzer()
     
     # Example: Analyze Apple
-    result = analyzer.analyze_stock("AAPL", )
+    result = asyncio.run(analyzer.analyze_stock("AAPL", ))
     
     # Print readable output
     print("\n" + "="*50)
@@ -1 +1,10 @@
 # App package
+import sys
+from pathlib import Path
+
+# The shared top-level packages (agents, optimizers, file_generator, services) live at the
+# repository root, next to backend/. Every app module is imported through this package,
+# so adding the root here makes them importable regardless of import order.
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
@@ -1,5 +1,6 @@
 import os
-from datetime import datetime, timedelta
+import time
+from datetime import timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from argon2 import PasswordHasher
@@ -18,6 +19,8 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 REFRESH_TOKEN_EXPIRE_DAYS = 7
+ACCESS_TOKEN_EXPIRE_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+REFRESH_TOKEN_EXPIRE_SECONDS = REFRESH_TOKEN_EXPIRE_DAYS * 86400
 
 pwd_hasher = PasswordHasher()
 security = HTTPBearer()
@@ -33,18 +36,13 @@ def get_password_hash(password: str) -> str:
     return pwd_hasher.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire, "type": "access"})
+    # exp is a plain epoch timestamp, which is what jose would convert a datetime to anyway
+    ttl = int(expires_delta.total_seconds()) if expires_delta else ACCESS_TOKEN_EXPIRE_SECONDS
+    to_encode = {**data, "exp": int(time.time()) + ttl, "type": "access"}
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def create_refresh_token(data: dict) -> str:
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire, "type": "refresh"})
+    to_encode = {**data, "exp": int(time.time()) + REFRESH_TOKEN_EXPIRE_SECONDS, "type": "refresh"}
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def generate_tokens(user_id: int) -> tuple[str, str]:
@@ -64,15 +62,18 @@ def get_current_user(
     )
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
+        subject: str = payload.get("sub")
         token_type: str = payload.get("type")
         
-        if user_id is None or token_type != "access":
+        # jose only checks exp when it is present, so a token without one never expires
+        if subject is None or token_type != "access" or payload.get("exp") is None:
             raise credentials_exception
-    except JWTError:
+        user_id = int(subject)
+    except (JWTError, ValueError):
         raise credentials_exception
-    
-    user = db.query(User).filter(User.id == int(user_id)).first()
+
+    # Primary-key lookup through this request's session (identity map first)
+    user = db.get(User, user_id)
     if user is None:
         raise credentials_exception
     if not user.is_active:
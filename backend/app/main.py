@@ -1,25 +1,73 @@
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+import anyio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from app.database import engine
 from app import models
-from app.routes.main_router import router as main_router
+from app.routes.main_router import router as main_router, get_analyzer, get_filter_agent
+from services.yf_session import yf_session
+from services.http_clients import close_http_clients
 
-# Create tables
-models.Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+
+async def warm_up() -> None:
+    """
+    Builds the shared agents and opens keep-alive connections to OpenAI and Yahoo,
+    so the first real request doesn't pay for prompt reads, DNS and TLS.
+    """
+    analyzer = get_analyzer()
+    get_filter_agent()
+    results = await asyncio.gather(
+        analyzer.client.models.list(),
+        asyncio.to_thread(yf_session.get, "https://query1.finance.yahoo.com", timeout=5),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            logger.warning("Warm-up request failed: %s", result)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create tables once at startup rather than at import (alembic upgrade head is the production path)
+    await asyncio.to_thread(models.Base.metadata.create_all, bind=engine)
+    # Sync endpoints (e.g. /optimize) run in anyio's threadpool, which defaults to 40 threads
+    anyio.to_thread.current_default_thread_limiter().total_tokens = int(os.getenv("THREADPOOL_SIZE", "100"))
+    if os.getenv("WARM_UP_ON_STARTUP", "1") == "1":
+        try:
+            await asyncio.wait_for(warm_up(), timeout=10)
+        except Exception as e:
+            logger.warning("Warm-up skipped: %r", e)
+    yield
+    await close_http_clients()
 
 app = FastAPI(
+    lifespan=lifespan,
     title="ByteBank API",
     description="Secure authentication API",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
+# Explicit origins and headers (no wildcards) let browsers cache credentialed preflights for max_age
+# The localhost default only suits local development; deployments must list their frontend origins
+DEV_CORS_ORIGINS = "http://localhost:3000,http://localhost:5173"
+APP_ENV = os.getenv("APP_ENV", "development")
+if "CORS_ORIGINS" not in os.environ and APP_ENV != "development":
+    logger.warning("CORS_ORIGINS is not set in %s; only %s will be allowed", APP_ENV, DEV_CORS_ORIGINS)
+CORS_ORIGINS = [o.strip() for o in os.getenv("CORS_ORIGINS", DEV_CORS_ORIGINS).split(",") if o.strip()]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,
 )
 
 # Include routers
@@ -1,28 +1,37 @@
-from fastapi import APIRouter, HTTPException, Response
+from fastapi import APIRouter, Depends, HTTPException, Response
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
-from decimal import Decimal
-import yfinance as yf
 from yfinance import EquityQuery
-import io
+import os
+import re
 import asyncio
+import logging
+import functools
+from types import MappingProxyType
+from cachetools import TTLCache
 
-# Import your custom classes
-# Adjust imports based on your actual directory structure
-import sys
-from pathlib import Path
-
-# Add the parent directory to the path so we can import from agents, optimizers, etc.
-backend_dir = Path(__file__).resolve().parent.parent.parent.parent
-sys.path.insert(0, str(backend_dir))
+# agents, optimizers, etc. live at the repository root, which the app package puts on sys.path
 from agents.nlp_to_filter_agent import StockMarket
-from agents.nlp_to_filter_agent import NLPToFilterAgent, StockMarket as FilterMarket, FilterObject
+from agents.nlp_to_filter_agent import NLPToFilterAgent, StockMarket as FilterMarket, FilterObject, OperationEnum, OPERATION_MAP as OPERATION_ALIASES
 from agents.stock_analyzer import StockAnalyzer, StockMarket as AnalyzerMarket, StockAnalysisResult
 from optimizers.allocation_optimizer import PortfolioOptimizer, StockMarket as OptimizerMarket
 from file_generator.pdf_generator import PDFReportGenerator
+from services import yf_batch
+from services.coalesce import coalesce
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# --- Shared agents ---
+# Built once per process so the OpenAI clients, connection pools and prompt templates are reused
+@functools.cache
+def get_filter_agent() -> NLPToFilterAgent:
+    return NLPToFilterAgent()
+
+@functools.cache
+def get_analyzer() -> StockAnalyzer:
+    return StockAnalyzer()
 
 # --- Request Models ---
 
@@ -47,15 +56,26 @@ class StockMetaData(BaseModel):
     symbol: str
     company: str
     sector: str
-    price: Decimal
-    change: Decimal
-    p_e: Decimal
-    cap: Decimal
+    price: float
+    change: float
+    p_e: float
+    cap: float
 
 class ScreenerResponse(BaseModel):
     data: list[StockMetaData]
     sqlQuery: str
 
+class ScreenAnalysisRequest(ScreenerRequest):
+    limit: int = 10  # Analyze at most this many of the screened tickers
+
+class ScreenAnalysisResponse(BaseModel):
+    analyses: list[StockAnalysisResult]
+    failed: list[str]
+    sqlQuery: str
+
+# Max concurrent analyses per /screen/analyze request; tune to the OpenAI tier's rate limits
+ANALYSIS_CONCURRENCY = int(os.environ.get("ANALYSIS_CONCURRENCY", "8"))
+
 # --- Helper to resolve Market Enums ---
 # Since different files defined their own Enums, we map string to the specific Enum needed
 def get_market_enum(market_str: str, enum_cls) -> StockMarket:
@@ -68,38 +88,67 @@ def get_market_enum(market_str: str, enum_cls) -> StockMarket:
         raise HTTPException(status_code=400, detail="Market must be 'US' or 'SR'")
 
 # --- Helper to map operation descriptions to EquityQuery symbols ---
-OPERATION_MAP = {
-    "equals": "eq",
-    "greater than": "gt",
-    "less than": "lt",
-    "greater than or equal to": "gte",
-    "less than or equal to": "lte",
-    "is in list": "is-in",
-    "between two values": "btwn",
+OPERATION_SYMBOLS = {
+    OperationEnum.EQUALS: "eq",
+    OperationEnum.GREATER_THAN: "gt",
+    OperationEnum.LESS_THAN: "lt",
+    OperationEnum.GREATER_THAN_OR_EQUAL_TO: "gte",
+    OperationEnum.LESS_THAN_OR_EQUAL_TO: "lte",
+    OperationEnum.IS_IN_LIST: "is-in",
+    OperationEnum.BETWEEN: "btwn",
 }
 
+# Every normalized alias the filter agent accepts, resolved to its symbol up front
+OPERATION_MAP = MappingProxyType({alias: OPERATION_SYMBOLS[op] for alias, op in OPERATION_ALIASES.items()})
+
+_INT_RE = re.compile(r"-?\d+")
+_FLOAT_RE = re.compile(r"-?(?:\d+\.\d*|\.\d+)")
+
+@functools.lru_cache(maxsize=256)
 def get_operation_symbol(operation_desc: str) -> str:
     """Convert operation description to EquityQuery symbol."""
-    operation_lower = operation_desc.lower().strip()
-    if operation_lower in OPERATION_MAP:
-        return OPERATION_MAP[operation_lower]
-    # Try partial matching for flexibility
-    for desc, symbol in OPERATION_MAP.items():
-        if desc in operation_lower or operation_lower in desc:
-            return symbol
     # Default to 'eq' if no match found
-    return "eq"
+    return OPERATION_MAP.get(" ".join(operation_desc.split()).lower(), "eq")
 
 def parse_filter_value(value: str):
     """Parse filter value to appropriate type (number or string)."""
-    try:
-        # Try to parse as float
-        if '.' in value:
-            return float(value)
-        return int(value)
-    except ValueError:
-        # Return as string if not a number
-        return value
+    stripped = value.strip()
+    # Most values are plain non-negative integers; skip the regexes for those
+    if stripped.isdigit() and stripped.isascii():
+        return int(stripped)
+    if _INT_RE.fullmatch(stripped):
+        return int(stripped)
+    if _FLOAT_RE.fullmatch(stripped):
+        return float(stripped)
+    # Return as string if not a number
+    return value
+
+# Market-specific exchange filters never change, so build them once
+MARKET_EXCHANGE_QUERIES = {
+    "US": EquityQuery('is-in', ['exchange', 'NMS', 'NYQ']),
+    "SR": EquityQuery('eq', ['exchange', 'SAU']),
+}
+
+def _build_between(field_name: str, op_symbol: str, filter_value: str) -> Optional[EquityQuery]:
+    # Between requires two values - assume comma-separated
+    values = [parse_filter_value(v.strip()) for v in filter_value.split(',')]
+    if len(values) != 2:
+        return None
+    return EquityQuery(op_symbol, [field_name, *values])
+
+def _build_is_in(field_name: str, op_symbol: str, filter_value: str) -> EquityQuery:
+    # Is-in requires a list of values
+    return EquityQuery(op_symbol, [field_name, *(v.strip() for v in filter_value.split(','))])
+
+def _build_comparison(field_name: str, op_symbol: str, filter_value: str) -> EquityQuery:
+    # Standard comparison operators
+    return EquityQuery(op_symbol, [field_name, parse_filter_value(filter_value)])
+
+# EquityQuery builder per operation symbol; anything else is a plain comparison
+FILTER_BUILDERS = {
+    "btwn": _build_between,
+    "is-in": _build_is_in,
+}
 
 def build_equity_query(filters: List[FilterObject], market: str) -> EquityQuery:
     """
@@ -111,17 +160,12 @@ def build_equity_query(filters: List[FilterObject], market: str) -> EquityQuery:
         EquityQuery('lt', ["epsgrowth.lasttwelvemonths", 15])
     ])
     """
-    query_parts = []
-    
     # Add market-specific exchange filter
-    if market.upper() == "US":
-        query_parts.append(EquityQuery('is-in', ['exchange', 'NMS', 'NYQ']))
-    elif market.upper() == "SR":
-        query_parts.append(EquityQuery('eq', ['exchange', 'SAU']))
+    prefix = MARKET_EXCHANGE_QUERIES.get(market.upper())
+    query_parts = [prefix] if prefix is not None else []
     
     # Convert each filter to an EquityQuery
     for f in filters:
-        # Remove category prefix (e.g., "price.intradaymarketcap" -> "intradaymarketcap")
         field_name = f.get("filterName")
         
         # Skip exchange filters - we already hardcode them based on market
@@ -129,150 +173,228 @@ def build_equity_query(filters: List[FilterObject], market: str) -> EquityQuery:
             continue
         
         op_symbol = get_operation_symbol(f.get("operation"))
-        value = parse_filter_value(f.get("filterValue"))
-        
-        if op_symbol == "btwn":
-            # Between requires two values - assume comma-separated
-            values = [parse_filter_value(v.strip()) for v in f.get("filterValue").split(',')]
-            if len(values) == 2:
-                query_parts.append(EquityQuery(op_symbol, [field_name, values[0], values[1]]))
-        elif op_symbol == "is-in":
-            # Is-in requires a list of values
-            values = [v.strip() for v in f.get("filterValue").split(',')]
-            query_parts.append(EquityQuery(op_symbol, [field_name] + values))
-        else:
-            # Standard comparison operators
-            query_parts.append(EquityQuery(op_symbol, [field_name, value]))
+        builder = FILTER_BUILDERS.get(op_symbol, _build_comparison)
+        part = builder(field_name, op_symbol, f.get("filterValue"))
+        if part is not None:
+            query_parts.append(part)
     
     # If only one filter (including exchange), return it directly
     if len(query_parts) == 1:
         return query_parts[0]
-    print("Query Parts:", query_parts)
+    logger.debug("Query parts: %s", query_parts)
     # Combine all filters with AND
     return EquityQuery('and', query_parts)
 
-def get_stock_metadata(ticker_symbol: str) -> StockMetaData:
+def quote_to_metadata(quote: dict, sector: Optional[str] = None) -> StockMetaData:
+    """
+    Maps one Yahoo quote result onto StockMetaData. The quote endpoint carries
+    no sector, so it is passed in from the ticker's `.info`.
+    """
+    current_price = quote.get('regularMarketPrice')
+    previous_close = quote.get('regularMarketPreviousClose')
+
+    # Calculate change (Price - Prev Close)
+    if current_price and previous_close:
+        price_change = current_price - previous_close
+    else:
+        price_change = 0.0
+
+    return StockMetaData(
+        symbol=quote['symbol'],
+        company=quote.get('shortName') or 'Unknown Company',
+        sector=sector or 'Unknown Sector',
+        price=round(current_price or 0.0, 2),
+        change=round(price_change, 2),
+        # trailingPE can be missing for unprofitable companies
+        p_e=round(quote.get('trailingPE') or 0.0, 2),
+        # Market Cap is usually a large integer/float
+        cap=round(quote.get('marketCap') or 0.0, 2)
+    )
+
+async def fetch_sectors(symbols: List[str]) -> dict:
     """
-    Fetches stock metadata for a given ticker symbol using yfinance.
+    Looks up the sector of each symbol from its (cached, batched) `.info`.
+    Symbols whose lookup fails are left out.
     """
+    infos = await asyncio.gather(*(yf_batch.get_info(sym) for sym in symbols), return_exceptions=True)
+    sectors = {}
+    for sym, info in zip(symbols, infos):
+        if isinstance(info, Exception):
+            logger.warning("Failed to fetch sector for %s: %s", sym, info)
+        elif info.get('sector'):
+            sectors[sym] = info['sector']
+    return sectors
+
+async def get_stock_metadata_batch(screened: List[dict]) -> List[StockMetaData]:
+    """
+    Builds metadata from the screener's own quote objects, which already carry
+    price, P/E and market cap. Only quotes missing a price are re-fetched, with
+    batched Yahoo quote requests (one request per 10 symbols). Sectors come
+    from `.info`, fetched alongside the quotes.
+    """
+    quotes = {quote['symbol']: quote for quote in screened if quote.get('regularMarketPrice') is not None}
+    missing = [quote['symbol'] for quote in screened if quote['symbol'] not in quotes]
+    sectors_task = fetch_sectors([quote['symbol'] for quote in screened])
+    if missing:
+        fetched, sectors = await asyncio.gather(yf_batch.get_quotes(missing), sectors_task)
+        quotes.update(fetched)
+    else:
+        sectors = await sectors_task
+
+    metadata = []
+    for quote in screened:
+        sym = quote['symbol']
+        quote = quotes.get(sym)
+        if quote is None:
+            logger.warning("Failed to fetch %s: no quote returned", sym)
+            continue
+        try:
+            metadata.append(quote_to_metadata(quote, sectors.get(sym)))
+        except Exception as e:
+            logger.warning("Failed to fetch %s: %s", sym, e)
+    return metadata
+
+# Company websites practically never change, so keep them for a day
+_website_cache: TTLCache = TTLCache(maxsize=10_000, ttl=86400)
+
+async def fetch_website(ticker_symbol: str) -> str:
+    """
+    Looks up the company website (used for the PDF logo) without blocking the event loop.
+    """
+    website = _website_cache.get(ticker_symbol)
+    if website is not None:
+        return website
     try:
-        ticker = yf.Ticker(ticker_symbol)
-        
-        # .fast_info is often faster/more reliable for price data than .info
-        current_price = ticker.fast_info.last_price
-        previous_close = ticker.fast_info.previous_close
-        
-        # .info dictionary contains the metadata
-        info = ticker.info
-        
-        # Calculate change (Price - Prev Close)
-        if current_price and previous_close:
-            price_change = current_price - previous_close
-        else:
-            price_change = 0.0
-
-        # Helper to safely convert float/None to Decimal
-        def to_decimal(value, default=0.0):
-            if value is None:
-                return Decimal(str(default))
-            # Convert to string first to avoid floating point arithmetic artifacts
-            return Decimal(str(value))
-
-        return StockMetaData(
-            symbol=info.get('symbol', ticker_symbol.upper()),
-            company=info.get('shortName', 'Unknown Company'),
-            sector=info.get('sector', 'Unknown Sector'),
-            
-            # fast_info provides floats, convert to Decimal
-            price=to_decimal(current_price).quantize(Decimal("0.01")),
-            change=to_decimal(price_change).quantize(Decimal("0.01")),
-            
-            # info['trailingPE'] can be None for unprofitable companies
-            p_e=to_decimal(info.get('trailingPE'), default=0.0).quantize(Decimal("0.01")),
-            # Market Cap is usually a large integer/float
-            cap=to_decimal(info.get('marketCap'), default=0.0).quantize(Decimal("1.00"))
-        )
+        info = await yf_batch.get_info(ticker_symbol)
+    except Exception:
+        return ""
+    website = _website_cache[ticker_symbol] = info.get('website', '')
+    return website
 
-    except Exception as e:
-        # In a real app, you might raise a custom HTTP exception or log this
-        print(f"Error fetching data for {ticker_symbol}: {e}")
-        # Return empty/zeroed object or re-raise
-        raise e    
+# Parsed queries keyed by (normalized query, market): repeats skip the LLM entirely
+_parsed_query_cache: TTLCache = TTLCache(maxsize=1024, ttl=3600)
+
+async def parse_query(agent: NLPToFilterAgent, query: str, market: str) -> tuple[dict, EquityQuery]:
+    """
+    NLP query -> (filter response, EquityQuery), memoized per normalized query and market.
+    """
+    key = (" ".join(query.split()).lower(), market.upper())
+    parsed = _parsed_query_cache.get(key)
+    if parsed is not None:
+        return parsed
+
+    async def parse() -> tuple[dict, EquityQuery]:
+        # 2. Get Filter Criteria from NLP
+        # Async client, so the LLM round trip doesn't stall the event loop
+        filter_response = await agent.filter_stocks_async(query, market=get_market_enum(market, StockMarket))
+        logger.debug("Parsed filters: %s", filter_response.get("filters"))
+
+        # 3. Build EquityQuery from filters
+        equity_query = build_equity_query(filter_response.get("filters"), market)
+        logger.debug("EquityQuery: %s", equity_query)
+
+        _parsed_query_cache[key] = (filter_response, equity_query)
+        return filter_response, equity_query
+
+    # Identical queries arriving together share one LLM call
+    return await coalesce(("parse_query", key), parse)
+
+SCREEN_TIMEOUT_DETAIL = "Yahoo Finance did not respond in time, please retry"
+
+async def run_screen(agent: NLPToFilterAgent, request: ScreenerRequest) -> tuple[dict, list[dict]]:
+    """
+    NLP query -> filters -> EquityQuery -> screened quotes.
+    """
+    filter_response, equity_query = await parse_query(agent, request.query, request.market)
+
+    # 4. Execute the screener query
+    result = await yf_batch.run_in_pool(yf_batch.screen, equity_query, 250, timeout=yf_batch.YF_SCREEN_TIMEOUT)
+    logger.debug("Screener returned %d quotes", len(result.get("quotes", [])) if result else 0)
+
+    if result and 'quotes' in result:
+        return filter_response, result['quotes']
+    return filter_response, []
 
 # --- 1. Screener Endpoint ---
-@router.post("/screen", response_model=ScreenerResponse)
-async def screen_stocks(request: ScreenerRequest):
+# The response is built and validated here, so serialize it straight to JSON with
+# pydantic-core rather than a second response_model pass
+@router.post("/screen", response_model=None, responses={200: {"model": ScreenerResponse}})
+async def screen_stocks(request: ScreenerRequest, agent: NLPToFilterAgent = Depends(get_filter_agent)):
     """
     Takes natural language query -> Agents parse filters -> Returns Tickers.
     """
     try:
-        # 1. Initialize Agent
-        agent = NLPToFilterAgent()
-        market_enum = get_market_enum(request.market, StockMarket)
-        
-        # 2. Get Filter Criteria from NLP
-        filter_response = agent.filter_stocks(request.query, market=market_enum)
-        
-        print(f"Parsed Filters: {filter_response.get("filters")}")
-        
-        # 3. Build EquityQuery from filters
-        equity_query = build_equity_query(filter_response.get("filters"), request.market)
-        
-        print(f"EquityQuery: {equity_query}")
-        
-        # 4. Execute the screener query
-        screener = yf.screen(equity_query, count=250)
-        result = screener
-        print(f"Screener Result: {result}")
-        
-        # 5. Extract tickers from the result
-        if result and 'quotes' in result:
-            symbols = [quote['symbol'] for quote in result['quotes']]
-            
-            # Use a Semaphore to limit concurrency to 250 (as requested)
-            # This prevents opening too many sockets at once if the list grows
-            sem = asyncio.Semaphore(250)
-
-            async def fetch_stock_safe(sym):
-                async with sem:
-                    # asyncio.to_thread runs the synchronous yfinance code in a separate thread
-                    # preventing it from blocking the main event loop
-                    try:
-                        return await asyncio.to_thread(get_stock_metadata, sym)
-                    except Exception as e:
-                        print(f"Failed to fetch {sym}: {e}")
-                        return None
-
-            # Launch all tasks simultaneously
-            tasks = [fetch_stock_safe(sym) for sym in symbols]
-            
-            # gather waits for all to complete
-            results = await asyncio.gather(*tasks)
-            
-            # Filter out any failures (None values)
-            tickers = [r for r in results if r is not None]
-            if request.market == StockMarket.SA:
-                tickers = [r.split(".")[0] if "." in r else r for r in tickers]
-        else:
-            tickers = []
-        # te
-        print("i love u")
-        return ScreenerResponse(
+        filter_response, quotes = await run_screen(agent, request)
+
+        # 5. Build metadata for the screened tickers
+        tickers = await get_stock_metadata_batch(quotes) if quotes else []
+        if request.market == StockMarket.SA:
+            tickers = [t.model_copy(update={"symbol": t.symbol.split(".")[0]}) for t in tickers]
+        response = ScreenerResponse(
             data=tickers,
             sqlQuery= filter_response.get("sqlQuery")
         )
+        return Response(content=response.model_dump_json(), media_type="application/json")
+
+    except TimeoutError:
+        logger.warning("Screener timed out waiting for Yahoo Finance")
+        raise HTTPException(status_code=504, detail=SCREEN_TIMEOUT_DETAIL)
+    except Exception as e:
+        logger.exception("Screener request failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/screen/analyze", response_model=ScreenAnalysisResponse)
+async def screen_and_analyze(request: ScreenAnalysisRequest,
+                             agent: NLPToFilterAgent = Depends(get_filter_agent),
+                             analyzer: StockAnalyzer = Depends(get_analyzer)):
+    """
+    Takes natural language query -> Screens tickers -> Returns AI Analysis for the top `limit` of them.
+    """
+    try:
+        filter_response, quotes = await run_screen(agent, request)
+        market_enum = get_market_enum(request.market, StockMarket)
+        # The analyzer re-appends the market suffix itself
+        symbols = [quote['symbol'].split(".")[0] for quote in quotes[:max(request.limit, 0)]]
+
+        # Run the analyses concurrently, bounded so bursts stay within the OpenAI rate limits
+        sem = asyncio.Semaphore(ANALYSIS_CONCURRENCY)
+
+        async def analyze_one(sym):
+            async with sem:
+                return await analyzer.analyze_stock(sym, market=market_enum)
+
+        results = await asyncio.gather(*(analyze_one(sym) for sym in symbols), return_exceptions=True)
+
+        analyses, failed = [], []
+        for sym, result in zip(symbols, results):
+            if isinstance(result, Exception):
+                logger.warning("Failed to analyze %s: %s", sym, result)
+                failed.append(sym)
+            else:
+                analyses.append(result)
+
+        return ScreenAnalysisResponse(
+            analyses=analyses,
+            failed=failed,
+            sqlQuery=filter_response.get("sqlQuery")
+        )
 
+    except HTTPException:
+        raise
+    except TimeoutError:
+        logger.warning("Screener timed out waiting for Yahoo Finance")
+        raise HTTPException(status_code=504, detail=SCREEN_TIMEOUT_DETAIL)
     except Exception as e:
-        import traceback
-        traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # --- 2. Optimizer Endpoint ---
 @router.post("/optimize")
-async def optimize_portfolio(request: OptimizerRequest):
+def optimize_portfolio(request: OptimizerRequest):
     """
     Takes list of tickers -> Returns optimized allocation (Sharpe Ratio).
+    Plain `def`: the download and optimization are blocking, so FastAPI runs this in its threadpool.
     """
     try:
         # 1. Resolve Market Enum
@@ -283,7 +405,7 @@ async def optimize_portfolio(request: OptimizerRequest):
         optimizer = PortfolioOptimizer(tickers=request.tickers, stock_market=market_enum)
         
         # 3. Calculate Result
-        result = optimizer.return_highest_sharpe_ratio(budget=Decimal(request.budget))
+        result = optimizer.return_highest_sharpe_ratio(budget=request.budget)
         
         return result
 
@@ -292,18 +414,19 @@ async def optimize_portfolio(request: OptimizerRequest):
 
 
 # --- 3. Analysis Endpoint ---
-@router.post("/analyze", response_model=StockAnalysisResult)
-async def analyze_stock(request: AnalysisRequest):
+# The result is already validated by the structured-output parser, so skip FastAPI's
+# response_model pass and serialize it straight to JSON (the schema stays in the docs)
+@router.post("/analyze", response_model=None, responses={200: {"model": StockAnalysisResult}})
+async def analyze_stock(request: AnalysisRequest, analyzer: StockAnalyzer = Depends(get_analyzer)):
     """
     Takes a single ticker -> Returns AI Analysis (Financials, SWOT, Outlook).
     """
     try:
         market_enum = get_market_enum(request.market, StockMarket)
         
-        analyzer = StockAnalyzer()
-        result = analyzer.analyze_stock(request.ticker, market=market_enum)
+        result = await analyzer.analyze_stock(request.ticker, market=market_enum)
         
-        return result
+        return Response(content=result.model_dump_json(), media_type="application/json")
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -311,43 +434,43 @@ async def analyze_stock(request: AnalysisRequest):
 
 # --- 4. PDF Report Endpoint ---
 @router.post("/report/pdf")
-async def generate_pdf_report(request: PDFRequest):
+async def generate_pdf_report(request: PDFRequest, analyzer: StockAnalyzer = Depends(get_analyzer)):
     """
     Takes a single ticker -> Runs Analysis -> Generates PDF -> Returns File Stream.
     """
     try:
         market_enum = get_market_enum(request.market, StockMarket)
         
-        # 1. Run Analysis
-        analyzer = StockAnalyzer()
-        analysis_result = analyzer.analyze_stock(request.ticker, market=market_enum)
-        
-        # 2. Fetch Metadata (Website for Logo)
-        # This logic is adapted from your pdf_generator.py main block
         ticker_lookup = request.ticker
         if market_enum == AnalyzerMarket.SA:
             ticker_lookup = f"{request.ticker}.SR"
-            
-        try:
-            stock_info = yf.Ticker(ticker_lookup).info
-            website = stock_info.get('website', '')
-        except Exception:
-            website = ""
+
+        # 1 & 2. Run Analysis and fetch Metadata (Website for Logo) concurrently
+        analysis_result, website = await asyncio.gather(
+            analyzer.analyze_stock(request.ticker, market=market_enum),
+            fetch_website(ticker_lookup),
+        )
 
         # 3. Generate PDF
         pdf_gen = PDFReportGenerator(analysis_result)
-        pdf_buffer = pdf_gen.create_pdf(website_url=website)
+        pdf_chunks = pdf_gen.iter_pdf(website_url=website)
+        # Pull the first chunk here so build errors still surface as a 500
+        first_chunk = await anext(pdf_chunks)
+
+        async def pdf_stream():
+            yield first_chunk
+            async for chunk in pdf_chunks:
+                yield chunk
         
         # 4. Return as file stream
         filename = f"{analysis_result.ticker}_Analysis.pdf"
         
         return StreamingResponse(
-            pdf_buffer, 
+            pdf_stream(),
             media_type="application/pdf", 
             headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("PDF generation failed")
         raise HTTPException(status_code=500, detail=f"PDF Generation failed: {str(e)}")
\ No newline at end of file
@@ -1,7 +1,13 @@
 import os
+import asyncio
+import logging
+import tempfile
+import threading
 from datetime import datetime
+from typing import AsyncIterator
 from io import BytesIO
 import requests
+from cachetools import TTLCache
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -9,17 +15,76 @@ from reportlab.lib.units import inch, mm
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, HRFlowable
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 import yfinance as yf
+from services.yf_session import yf_session
 from agents.stock_analyzer import StockAnalyzer, StockMarket
 from io import BytesIO
 
 # Import your models to type hint correctly (optional but good practice)
 # from stock_analyzer import StockAnalysisResult 
 
+logger = logging.getLogger(__name__)
+
+LOGO_TIMEOUT = (1.5, 2.0)  # (connect, read) seconds; a slow logo must not stall the report
+# domain -> logo bytes, or b"" when there is no logo, so misses aren't retried for a day.
+# Reports are built on worker threads, hence the lock
+_logo_cache: TTLCache = TTLCache(maxsize=512, ttl=86400)
+_logo_cache_lock = threading.Lock()
+_logo_session = requests.Session()
+_logo_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=50))
+
+def _fetch_logo(domain: str) -> bytes:
+    with _logo_cache_lock:
+        cached = _logo_cache.get(domain)
+    if cached is not None:
+        return cached
+    response = _logo_session.get(f"https://logo.clearbit.com/{domain}", timeout=LOGO_TIMEOUT)
+    content = response.content if response.status_code == 200 else b""
+    with _logo_cache_lock:
+        _logo_cache[domain] = content
+    return content
+
+PDF_CHUNK_SIZE = 64 * 1024
+# Reports smaller than this stay in memory; larger ones spill to a temp file
+PDF_SPOOL_MAX_SIZE = 1024 * 1024
+
+# Styles are read-only once built, so every report shares one set instead of rebuilding them
+STYLES = getSampleStyleSheet()
+
+HEADER_TITLE_STYLE = ParagraphStyle(
+    'HeaderTitle',
+    parent=STYLES['Heading1'],
+    fontSize=24,
+    alignment=TA_LEFT,
+    spaceAfter=0
+)
+
+HEADER_SUB_STYLE = ParagraphStyle(
+    'HeaderSub',
+    parent=STYLES['Normal'],
+    fontSize=12,
+    textColor=colors.gray
+)
+
+def _score_style(color):
+    return ParagraphStyle(
+        'Score',
+        parent=STYLES['Heading2'],
+        fontSize=20,
+        alignment=TA_CENTER,
+        textColor=color,
+        borderWidth=1,
+        borderColor=color,
+        borderPadding=10,
+        borderRadius=5
+    )
+
+SCORE_STYLES = {color: _score_style(color) for color in (colors.green, colors.orange, colors.red)}
+
 class PDFReportGenerator:
     def __init__(self, analysis_result):
         self.data = analysis_result
         self.filename = f"{self.data.ticker}_Analysis_Report.pdf"
-        self.styles = getSampleStyleSheet()
+        self.styles = STYLES
         self.width, self.height = A4
 
     def _get_logo_image(self, website_url):
@@ -36,39 +101,24 @@ class PDFReportGenerator:
             if "www." in domain:
                 domain = domain.replace("www.", "")
             
-            logo_url = f"https://logo.clearbit.com/{domain}"
-            response = requests.get(logo_url)
+            logo = _fetch_logo(domain)
             
-            if response.status_code == 200:
-                img_data = BytesIO(response.content)
+            if logo:
+                # A fresh Image per report; only the bytes are shared
+                img_data = BytesIO(logo)
                 img = Image(img_data, width=0.8*inch, height=0.8*inch)
                 img.hAlign = 'LEFT'
                 return img
         except Exception as e:
-            print(f"Could not fetch logo: {e}")
+            logger.warning("Could not fetch logo: %s", e)
         return None
 
     def _create_header(self, website):
         """Creates the header with Logo (left) and Title (right)."""
         logo = self._get_logo_image(website)
         
-        title_style = ParagraphStyle(
-            'HeaderTitle',
-            parent=self.styles['Heading1'],
-            fontSize=24,
-            alignment=TA_LEFT,
-            spaceAfter=0
-        )
-        
-        sub_title_style = ParagraphStyle(
-            'HeaderSub',
-            parent=self.styles['Normal'],
-            fontSize=12,
-            textColor=colors.gray
-        )
-
-        title_text = Paragraph(f"{self.data.stock_name} ({self.data.ticker})", title_style)
-        date_text = Paragraph(f"Report Generated: {datetime.now().strftime('%Y-%m-%d')}", sub_title_style)
+        title_text = Paragraph(f"{self.data.stock_name} ({self.data.ticker})", HEADER_TITLE_STYLE)
+        date_text = Paragraph(f"Report Generated: {datetime.now().strftime('%Y-%m-%d')}", HEADER_SUB_STYLE)
         
         # Table to align Logo and Text side-by-side
         if logo:
@@ -94,18 +144,7 @@ class PDFReportGenerator:
         elif score >= 50: color = colors.orange
         else: color = colors.red
         
-        score_style = ParagraphStyle(
-            'Score',
-            parent=self.styles['Heading2'],
-            fontSize=20,
-            alignment=TA_CENTER,
-            textColor=color,
-            borderWidth=1,
-            borderColor=color,
-            borderPadding=10,
-            borderRadius=5
-        )
-        return Paragraph(f"Stock Analysts Conviction Score: {score}/100", score_style)
+        return Paragraph(f"Stock Analysts Conviction Score: {score}/100", SCORE_STYLES[color])
 
     def _create_financial_table(self):
         """Creates a formatted table for key financials."""
@@ -168,6 +207,22 @@ class PDFReportGenerator:
 
     def create_pdf(self, website_url=None):
         buffer = BytesIO()
+        self._build_pdf(buffer, website_url)
+        buffer.seek(0)
+        return buffer
+
+    async def iter_pdf(self, website_url=None, chunk_size: int = PDF_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """
+        Builds the PDF off the event loop into a spooled temp file and yields it
+        in chunks, for use as a StreamingResponse body.
+        """
+        with tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_SIZE) as spool:
+            await asyncio.to_thread(self._build_pdf, spool, website_url)
+            spool.seek(0)
+            while chunk := spool.read(chunk_size):
+                yield chunk
+
+    def _build_pdf(self, output, website_url=None):
         story = []
         
         # 1. Header & Logo
@@ -201,13 +256,11 @@ class PDFReportGenerator:
         story.append(self._create_swot_section())
 
         # Build PDF
-        doc = SimpleDocTemplate(buffer, pagesize=A4,
+        doc = SimpleDocTemplate(output, pagesize=A4,
                                 rightMargin=40, leftMargin=40,
                                 topMargin=40, bottomMargin=40)
         doc.build(story)
-        print(f"PDF generated successfully: {self.filename}")
-        buffer.seek(0)
-        return buffer
+        logger.debug("PDF generated successfully: %s", self.filename)
 
 if __name__ == "__main__":
     ticker = "GOOGL"
@@ -215,14 +268,14 @@ if __name__ == "__main__":
     # 1. Run the AI Analysis
     print(f"--- Starting Analysis for {ticker} ---")
     analyzer = StockAnalyzer()
-    result = analyzer.analyze_stock(ticker, market=market)
+    result = asyncio.run(analyzer.analyze_stock(ticker, market=market))
     
     # 2. Get the website URL for the logo (quick fetch)
     print("--- Fetching meta-data for PDF ---")
     if market == StockMarket.SA:
         ticker = f"{ticker}.{market.value}"
     print(ticker)
-    stock_info = yf.Ticker(ticker).info
+    stock_info = yf.Ticker(ticker, session=yf_session).info
     website = stock_info.get('website', '') # e.g., https://www.nvidia.com
     
     # 3. Generate the PDF
@@ -1,328 +1,20 @@
-# import os
-# import pandas as pd
-# import requests
-# import numpy as np
-# import scipy.optimize as sco
-# import os
-# from dotenv import load_dotenv
-# from decimal import Decimal
-# from pydantic import BaseModel
-# from enum import StrEnum
-# import yfinance as yf
-# import logging
-
-# # Configure logging
-# logging.basicConfig(
-#     level=logging.DEBUG,
-#     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-# )
-# logger = logging.getLogger(__name__)
-
-# load_dotenv(override=True)
-# logger.info("Environment variables loaded")
-
-# class OptimizerResult(BaseModel):
-#     weights: dict[str,float]
-#     sharpe_ratio: float
-#     budget_allocation: dict[str, float]
-#     target_return: float
-#     volatility: float
-
-# class StockMarket(StrEnum):
-#     US = "US"
-#     SA = "SR"
-
-# class PortfolioOptimizer:
-
-
-#     def __init__(self, tickers: list[str], stock_market: StockMarket) -> None:
-#         try:
-#             logger.info("Initializing PortfolioOptimizer with tickers=%s, market=%s", tickers, stock_market)
-#             self.tickers = tickers
-#             self.stock_market = stock_market
-#             self.dates = None
-            
-#             logger.debug("Extracting historical data...")
-#             tickers_df = self.__extract_data()
-#             logger.debug("Data shape after extraction: %s", tickers_df.shape)
-            
-#             logger.debug("Normalizing data...")
-#             self.normalized_df = self.__normalize_data(tickers_df)
-#             logger.debug("Normalized data shape: %s", self.normalized_df.shape)
-            
-#             self.mean_returns = np.array([self.normalized_df.mean()[ticker] for ticker in self.tickers])
-#             logger.debug("Mean returns: %s", self.mean_returns)
-            
-#             self.cov = np.array(self.normalized_df.cov())
-#             logger.debug("Covariance matrix shape: %s", self.cov.shape)
-            
-#             self.n = len(self.tickers)
-#             logger.info("PortfolioOptimizer initialized successfully with %d tickers", self.n)
-#         except Exception as e:
-#             logger.error("Error during initialization: %s", str(e), exc_info=True)
-#             raise
-
-    
-#     def __extract_data(self) -> pd.DataFrame:
-#         """
-#         Fetches historical data using yfinance.
-#         - market: StockMarket Enum (US or SA).
-#         """
-#         try:
-#             logger.debug("Starting data extraction for market: %s", self.stock_market)
-            
-#             # 1. Adjust tickers based on the selected market
-#             formatted_tickers = []
-#             for ticker in self.tickers:
-#                 if self.stock_market == StockMarket.SA:
-#                     # Append suffix for Saudi market (e.g., 1120 -> 1120.SR)
-#                     formatted_ticker = f"{ticker}.{self.stock_market.value}"
-#                     formatted_tickers.append(formatted_ticker)
-#                     logger.debug("Formatted ticker %s to %s for Saudi market", ticker, formatted_ticker)
-#                 else:
-#                     # Default for US (no suffix needed usually)
-#                     formatted_tickers.append(ticker)
-#                     logger.debug("Using ticker %s for US market", ticker)
-
-#             logger.info("Downloading data for: %s", formatted_tickers)
-            
-#             # 2. Download data in batch (more efficient than looping)
-#             # using 'auto_adjust=True' gets the Adjusted Close directly as 'Close'
-#             data = yf.download(formatted_tickers, period="1y", auto_adjust=True, progress=False)
-#             logger.debug("Downloaded data shape: %s", data.shape)
-
-#             if len(self.tickers) == 1:
-#                 logger.debug("Single ticker detected, restructuring data")
-#                 prices_df = pd.DataFrame(data['Close'])
-#                 prices_df.columns = self.tickers
-#             else:
-#                 prices_df = data['Close']
-#                 logger.debug("Multiple tickers detected, columns before rename: %s", list(prices_df.columns))
-                
-#                 if self.stock_market == StockMarket.SA:
-#                     prices_df.columns = [col.replace(f".{self.stock_market.value}", "") for col in prices_df.columns]
-#                     logger.debug("Columns after rename: %s", list(prices_df.columns))
-
-#             # Ensure no missing data (forward fill then drop remaining)
-#             prices_df = prices_df.ffill().dropna()
-#             logger.info("Data extraction complete. Final shape: %s, Missing values: %d", prices_df.shape, prices_df.isnull().sum().sum())
-#             return prices_df
-#         except Exception as e:
-#             logger.error("Error during data extraction: %s", str(e), exc_info=True)
-#             raise
-
-#     def __normalize_data(self, tickers_df: pd.DataFrame) -> pd.DataFrame:
-#         try:
-#             logger.debug("Normalizing data with shape: %s", tickers_df.shape)
-#             normalized = tickers_df.pct_change().dropna()
-#             logger.debug("Normalized data shape: %s", normalized.shape)
-#             logger.debug("Normalized data statistics:\n%s", normalized.describe())
-#             return normalized
-#         except Exception as e:
-#             logger.error("Error during data normalization: %s", str(e), exc_info=True)
-#             raise
-    
-#     def _minimize_risks(self, daily_reward, budget: Decimal, allow_short=False):
-#         """
-#         Minimize portfolio variance subject to:
-#         - Expected return = daily_reward
-#         - Sum of weights = 1
-#         - Optional: No short selling (w >= 0)
-#         """
-#         try:
-#             logger.debug("Minimizing risks for daily_reward=%s, budget=%s, allow_short=%s", daily_reward, budget, allow_short)
-#             budget = float(budget)
-            
-#             def objective(w):
-#                 return w @ self.cov @ w
-            
-#             # Constraints
-#             constraints = [
-#                 {'type': 'eq', 'fun': lambda w: self.mean_returns @ w - daily_reward},  # Target return
-#                 {'type': 'eq', 'fun': lambda w: np.sum(w) - 1}  # Fully invested
-#             ]
-            
-#             # Bounds
-#             if allow_short:
-#                 bounds = [(None, None)] * self.n
-#                 logger.debug("Short selling allowed")
-#             else:
-#                 bounds = [(0, None)] * self.n  # No short selling
-#                 logger.debug("Short selling not allowed")
-            
-#             # Initial guess: equal weights
-#             w0 = np.ones(self.n) / self.n
-#             logger.debug("Initial weights: %s", w0)
-            
-#             # Optimize
-#             logger.debug("Starting optimization...")
-#             result = sco.minimize(objective, w0, method='SLSQP', bounds=bounds, constraints=constraints)
-            
-#             if not result.success:
-#                 logger.warning("Optimization did not converge. Message: %s", result.message)
-#             else:
-#                 logger.debug("Optimization successful")
-            
-#             w = result.x
-#             logger.debug("Optimized weights: %s", w)
-            
-#             # Build results
-#             results = {self.tickers[i]: float(w[i]) * budget for i in range(self.n)}
-#             results['daily_variance'] = float(w @ self.cov @ w)
-#             results['daily_return'] = float(self.mean_returns @ w * budget)
-#             results['daily_std'] = float(np.sqrt(w @ self.cov @ w) * budget)
-#             results['optimization_success'] = result.success
-            
-#             logger.debug("Results: variance=%s, return=%s, std=%s", results['daily_variance'], results['daily_return'], results['daily_std'])
-            
-#             return results
-#         except Exception as e:
-#             logger.error("Error during risk minimization: %s", str(e), exc_info=True)
-#             raise
-    
-
-    
-#     def efficient_frontier(self, budget: Decimal, n_points=50, allow_short=False):
-#         """
-#         Compute the efficient frontier: optimal portfolios for different return levels
-        
-#         Returns: List of dictionaries with portfolio weights and statistics
-#         """
-#         try:
-#             logger.info("Computing efficient frontier with n_points=%d, budget=%s", n_points, budget)
-#             min_return = np.min(self.mean_returns)
-#             max_return = np.max(self.mean_returns)
-#             budget = float(budget)
-#             logger.debug("Return range: [%s, %s]", min_return, max_return)
-            
-#             target_returns = np.linspace(min_return, max_return, n_points)
-#             frontier = []
-            
-#             for idx, target in enumerate(target_returns):
-#                 try:
-#                     logger.debug("Processing frontier point %d/%d, target_return=%s", idx+1, n_points, target)
-#                     result = self._minimize_risks(target, budget=budget, allow_short=allow_short)
-#                     if result['optimization_success']:
-#                         portfolio = {
-#                             'target_return': target,
-#                             'variance': result['daily_variance'],
-#                             'std': np.sqrt(result['daily_variance']),
-#                             'weights': {k: v/budget if budget > 0 else v 
-#                                        for k, v in result.items() 
-#                                        if k in self.tickers}
-#                         }
-#                         frontier.append(portfolio)
-#                         logger.debug("Successfully added portfolio to frontier")
-#                     else:
-#                         logger.warning("Optimization failed for target return %s", target)
-#                 except Exception as e:
-#                     logger.warning("Error processing frontier point %d: %s", idx, str(e))
-#                     continue
-            
-#             logger.info("Efficient frontier computed with %d successful portfolios", len(frontier))
-#             return frontier
-#         except Exception as e:
-#             logger.error("Error computing efficient frontier: %s", str(e), exc_info=True)
-#             raise
-    
-#     def return_highest_sharpe_ratio(self, budget: Decimal, allow_short=False)->OptimizerResult:
-#         """
-#         Find the portfolio with the highest Sharpe ratio
-        
-#         Returns: Dictionary with portfolio weights and statistics
-#         """
-#         try:
-#             logger.info("Finding highest Sharpe ratio portfolio with budget=%s", budget)
-            
-#             ef = self.efficient_frontier(budget=budget, allow_short=allow_short)
-#             logger.debug("Efficient frontier contains %d portfolios", len(ef))
-            
-#             if not ef:
-#                 logger.error("Efficient frontier is empty, cannot find best portfolio")
-#                 raise ValueError("Efficient frontier is empty")
-            
-#             best_portfolio = None
-        
-#             risk_free_rate = 0.03 / 252  # Assuming 3% annual risk-free rate
-#             logger.debug("Risk-free rate (daily): %s", risk_free_rate)
-
-#             max_sharpe_ratio = -np.inf
-#             portfolio_index = -1
-
-#             for i, portfolio in enumerate(ef):
-#                 try:
-#                     expected_return = portfolio['target_return']
-#                     std_dev = portfolio['std']
-                    
-#                     if std_dev == 0:
-#                         logger.warning("Portfolio %d has zero std_dev, skipping", i)
-#                         continue
-                    
-#                     sharpe_ratio = (expected_return - risk_free_rate) / std_dev
-#                     logger.debug("Portfolio %d: return=%s, std=%s, sharpe=%s", i, expected_return, std_dev, sharpe_ratio)
-                    
-#                     if sharpe_ratio > max_sharpe_ratio:
-#                         max_sharpe_ratio = sharpe_ratio
-#                         portfolio_index = i
-#                         logger.debug("New best Sharpe ratio: %s", max_sharpe_ratio)
-#                 except Exception as e:
-#                     logger.warning("Error calculating Sharpe ratio for portfolio %d: %s", i, str(e))
-#                     continue
-
-#             best_portfolio = ef[portfolio_index] if portfolio_index >= 0 else None
-            
-#             if best_portfolio is None:
-#                 logger.error("Could not find best portfolio")
-#                 raise ValueError("Could not find best portfolio")
-            
-#             allocation_budget = {k: v * float(budget) for k, v in best_portfolio['weights'].items()} if best_portfolio else None
-            
-#             logger.info("Best portfolio found with Sharpe ratio: %s", max_sharpe_ratio)
-#             logger.debug("Best portfolio weights: %s", best_portfolio['weights'])
-#             logger.debug("Best portfolio allocation: %s", allocation_budget)
-            
-#             result = OptimizerResult(
-#                 weights=best_portfolio['weights'] if best_portfolio else {},
-#                 sharpe_ratio=max_sharpe_ratio * np.sqrt(252),
-#                 budget_allocation=allocation_budget if allocation_budget else {},
-#                 target_return=best_portfolio.get("target_return") * 252,
-#                 volatility=np.sqrt(best_portfolio.get("variance") * 252)
-#             )
-            
-#             logger.info("Returning OptimizerResult with sharpe_ratio=%s, volatility=%s", result.sharpe_ratio, result.volatility)
-#             return result
-#         except Exception as e:
-#             logger.error("Error finding highest Sharpe ratio: %s", str(e), exc_info=True)
-#             raise
-        
-
-
-# if __name__ == '__main__':
-#     try:
-#         logger.info("="*50)
-#         logger.info("Starting PortfolioOptimizer main execution")
-#         logger.info("="*50)
-        
-#         optimizer = PortfolioOptimizer(['GOOGL', 'NVDA', 'AAPL'], StockMarket.US)
-#         logger.info("PortfolioOptimizer instance created successfully")
-        
-#         result = optimizer.return_highest_sharpe_ratio(budget=Decimal('10000'))
-#         logger.info("Optimization completed successfully")
-#         logger.info("Result: %s", result)
-#         print(result)
-#     except Exception as e:
-#         logger.error("Fatal error in main: %s", str(e), exc_info=True)
-#         raise
-
-
+import os
+import math
+import hashlib
+import functools
+from pathlib import Path
 import pandas as pd
 import numpy as np
+import scipy.linalg as sla
 import scipy.optimize as sco
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 from decimal import Decimal
 from pydantic import BaseModel
 from enum import StrEnum
+from typing import NamedTuple
 import yfinance as yf
+from services.yf_session import yf_session
 import logging
 
 # Configure logging
@@ -334,6 +26,10 @@ logger = logging.getLogger(__name__)
 
 load_dotenv(override=True)
 
+# Daily -> annual scaling for returns (x252) and for volatility/Sharpe (x sqrt(252))
+TRADING_DAYS = 252
+_SQRT_252 = float(np.sqrt(TRADING_DAYS))
+
 class OptimizerResult(BaseModel):
     weights: dict[str, float]
     sharpe_ratio: float
@@ -345,6 +41,158 @@ class StockMarket(StrEnum):
     US = "US"
     SA = "SR"
 
+class _FrontierTerms(NamedTuple):
+    g: np.ndarray  # Frontier weights are g + h * target_return
+    h: np.ndarray
+    inv_mu: np.ndarray  # Cov^-1 mu
+    inv_one: np.ndarray  # Cov^-1 1
+
+class FrontierPoint(NamedTuple):
+    weights: np.ndarray  # In actual_tickers order
+    target_return: float  # Daily
+    variance: float  # Daily
+    std: float  # Daily
+    success: bool
+
+class Frontier(NamedTuple):
+    """The efficient frontier as arrays, one row/entry per solved point (daily figures)."""
+    weights: np.ndarray  # (n_points, n), columns in actual_tickers order
+    returns: np.ndarray
+    variances: np.ndarray
+    stds: np.ndarray
+
+    def point(self, i: int) -> FrontierPoint:
+        return FrontierPoint(self.weights[i], float(self.returns[i]), float(self.variances[i]), float(self.stds[i]), True)
+
+# Downloaded history is also kept on disk, so restarts and other workers skip Yahoo too.
+# Files are named prices-<day>-<digest>.parquet; nothing else in the directory is touched.
+PRICE_CACHE_DIR = Path(os.environ.get("PRICE_CACHE_DIR", Path.home() / ".cache" / "bytebank"))
+PRICE_CACHE_PREFIX = "prices-"
+PRICE_HISTORY_PERIOD = "1y"
+
+def _price_cache_path(tickers: tuple[str, ...], period: str, day: str) -> Path:
+    digest = hashlib.sha256(f"{period}:{','.join(tickers)}".encode()).hexdigest()[:16]
+    return PRICE_CACHE_DIR / f"{PRICE_CACHE_PREFIX}{day}-{digest}.parquet"
+
+def _store_prices(path: Path, data: pd.DataFrame, day: str) -> None:
+    """Writes a complete download (see _missing_tickers) and prunes earlier days' files."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename, so concurrent readers never see a half-written file
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    data.to_parquet(tmp)
+    os.replace(tmp, path)
+    # Earlier days' files are never read again
+    for stale in path.parent.glob(f"{PRICE_CACHE_PREFIX}*.parquet"):
+        if not stale.name.startswith(f"{PRICE_CACHE_PREFIX}{day}-"):
+            stale.unlink(missing_ok=True)
+
+def _fetch_prices(tickers: tuple[str, ...], period: str) -> pd.DataFrame:
+    """One uncached yf.download of Close prices for `tickers`."""
+    # yfinance already fetches each ticker on its own thread, so one call covers any list size
+    data = yf.download(list(tickers), period=period, auto_adjust=True, progress=False, threads=True, session=yf_session)
+    # Only Close is used; drop Open/High/Low/Volume before the frame is cached in memory and on disk
+    if isinstance(data.columns, pd.MultiIndex):
+        if "Close" in data.columns.get_level_values(0):
+            data = data[["Close"]]
+    elif "Close" in data.columns:
+        data = data[["Close"]]
+    return data
+
+def _missing_tickers(data: pd.DataFrame, tickers: tuple[str, ...]) -> list[str]:
+    """Requested tickers without a single Close price in `data`."""
+    if data.empty or "Close" not in data.columns.get_level_values(0):
+        return list(tickers)
+    close = data["Close"]
+    if isinstance(close, pd.Series):
+        # Flat single-ticker frame
+        return [] if len(tickers) == 1 and close.notna().any() else list(tickers)
+    has_data = close.notna().any()
+    return [ticker for ticker in tickers if not has_data.get(ticker, False)]
+
+@functools.lru_cache(maxsize=64)
+def _download_prices(tickers: tuple[str, ...], period: str, day: str) -> pd.DataFrame:
+    """
+    One batched yf.download per ticker set and period per UTC day; `day` is only
+    part of the cache key, so entries roll over at midnight UTC. Pass `tickers`
+    sorted so any ordering of the same set shares an entry. Misses in memory are
+    served from the Parquet cache in PRICE_CACHE_DIR before going to Yahoo.
+
+    Raises ValueError if Yahoo returns no Close prices for any requested ticker
+    (it reports failed or rate-limited fetches that way rather than raising), so
+    a bad response is never cached and the next call retries.
+    """
+    path = _price_cache_path(tickers, period, day)
+    try:
+        cached = pd.read_parquet(path)
+        if not _missing_tickers(cached, tickers):
+            return cached
+        logger.warning("Ignoring incomplete price cache %s", path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning("Ignoring unreadable price cache %s: %s", path, e)
+
+    data = _fetch_prices(tickers, period)
+    missing = _missing_tickers(data, tickers)
+    if missing:
+        raise ValueError(f"No price data returned for: {', '.join(missing)}")
+
+    # Only complete downloads reach the disk, where every worker reuses them all day
+    try:
+        _store_prices(path, data, day)
+    except Exception as e:
+        logger.warning("Could not write price cache %s: %s", path, e)
+    return data
+
+def _ledoit_wolf(returns: np.ndarray) -> np.ndarray:
+    """
+    Ledoit-Wolf shrunk covariance of `returns` (observations x assets), as in
+    sklearn.covariance.LedoitWolf: the sample covariance pulled towards
+    (average variance) * I by the optimal shrinkage. A year of daily returns
+    makes a noisy, badly conditioned sample covariance for more than a handful
+    of tickers, and the frontier and tangency solves invert it.
+    """
+    n_obs, n_assets = returns.shape
+    centered = returns - returns.mean(axis=0)
+    gram = centered.T @ centered  # syrk
+    emp_cov = gram / n_obs
+    mu = np.trace(emp_cov) / n_assets
+
+    squared = centered ** 2
+    beta_ = np.sum(squared.T @ squared)
+    delta_ = np.sum(gram ** 2) / n_obs ** 2
+    beta = (beta_ / n_obs - delta_) / (n_assets * n_obs)
+    delta = (delta_ - 2.0 * mu * np.trace(emp_cov) + n_assets * mu ** 2) / n_assets
+    shrinkage = 0.0 if delta <= 0 else min(beta, delta) / delta
+
+    shrunk = (1.0 - shrinkage) * emp_cov
+    shrunk.flat[:: n_assets + 1] += shrinkage * mu
+    return shrunk
+
+# SLSQP callbacks, defined once at module level and fed their data through `args`
+def _portfolio_variance(w: np.ndarray, cov: np.ndarray) -> float:
+    return w @ cov @ w
+
+def _portfolio_variance_grad(w: np.ndarray, cov: np.ndarray) -> np.ndarray:
+    return 2 * (cov @ w)
+
+# Both equality constraints as one vector function: [mu; 1] @ w - [target, 1]
+def _equality_gap(w: np.ndarray, a_eq: np.ndarray, b_eq: np.ndarray) -> np.ndarray:
+    return a_eq @ w - b_eq
+
+def _equality_gap_jac(w: np.ndarray, a_eq: np.ndarray, b_eq: np.ndarray) -> np.ndarray:
+    return a_eq
+
+# Negative Sharpe ratio (mu.w - rf) / sqrt(w.T Cov w), minimized to find the max-Sharpe portfolio
+def _negative_sharpe(w: np.ndarray, mu: np.ndarray, cov: np.ndarray, risk_free: float) -> float:
+    return -(mu @ w - risk_free) / math.sqrt(max(w @ cov @ w, 1e-300))
+
+def _negative_sharpe_grad(w: np.ndarray, mu: np.ndarray, cov: np.ndarray, risk_free: float) -> np.ndarray:
+    cov_w = cov @ w
+    std = math.sqrt(max(w @ cov_w, 1e-300))
+    excess = mu @ w - risk_free
+    return -(mu / std - excess * cov_w / std ** 3)
+
 class PortfolioOptimizer:
 
     def __init__(self, tickers: list[str], stock_market: StockMarket) -> None:
@@ -361,6 +209,12 @@ class PortfolioOptimizer:
 
             logger.debug("Normalizing data...")
             self.normalized_df = self.__normalize_data(tickers_df)
+            if self.normalized_df.empty:
+                raise ValueError("No overlapping price history for the requested tickers.")
+            # yfinance sorts its columns; put them back in the caller's order (skipping any that failed)
+            ordered = [ticker for ticker in dict.fromkeys(self.tickers) if ticker in self.normalized_df.columns]
+            if len(ordered) == self.normalized_df.shape[1]:
+                self.normalized_df = self.normalized_df[ordered]
             
             # Recalculate tickers based on what we actually got back (in case some were delisted/failed)
             self.actual_tickers = list(self.normalized_df.columns)
@@ -368,8 +222,25 @@ class PortfolioOptimizer:
             
             # Annualized mean returns and Covariance
             # Note: We optimize on daily metrics, but keep track of structure
-            self.mean_returns = self.normalized_df.mean()
-            self.cov = self.normalized_df.cov()
+            # Plain contiguous float64 arrays, in actual_tickers order, for the solver's BLAS calls
+            returns = self.normalized_df.to_numpy(dtype=np.float64, copy=False)
+            self.mean_returns = returns.mean(axis=0)
+            # Shrunk rather than raw sample covariance, so the Cholesky solves stay well conditioned
+            self.cov = _ledoit_wolf(returns)
+
+            # Terms of the analytical frontier, reused by every efficient_frontier call
+            self._frontier_terms = self.__frontier_terms()
+
+            # Solver inputs that don't depend on the target return, built once
+            # Rows: target return (mu . w) and budget (sum(w)), evaluated with one matvec
+            self._a_eq = np.vstack([self.mean_returns, np.ones(self.n)])
+            self._a_budget = self._a_eq[1:]  # sum(w) alone, for the max-Sharpe solve
+            self._bounds = {
+                True: [(-1.0, 1.0)] * self.n,  # Allow shorting up to 100%
+                False: [(0.0, 1.0)] * self.n,  # Long only
+            }
+            # The frontier doesn't depend on the budget, so it's solved once per (n_points, allow_short)
+            self._frontier_cache: dict[tuple[int, bool], Frontier] = {}
             
             logger.info("Initialized successfully with %d tickers: %s", self.n, self.actual_tickers)
         except Exception as e:
@@ -392,8 +263,10 @@ class PortfolioOptimizer:
 
             logger.info("Downloading data for: %s", formatted_tickers)
             
-            # Fetch data
-            data = yf.download(formatted_tickers, period="1y", auto_adjust=True, progress=False)
+            # Fetch data (daily history only changes once a day, so repeats are served from memory)
+            today = datetime.now(timezone.utc).date().isoformat()
+            # Shallow copy so renaming columns below never touches the cached frame
+            data = _download_prices(tuple(sorted(set(formatted_tickers))), PRICE_HISTORY_PERIOD, today).copy(deep=False)
             
             # Handle yfinance structure variations
             prices_df = pd.DataFrame()
@@ -426,8 +299,8 @@ class PortfolioOptimizer:
             if self.stock_market == StockMarket.SA:
                 prices_df.columns = [col.replace(f".{self.stock_market.value}", "") for col in prices_df.columns]
             
-            # Final Cleanup
-            prices_df = prices_df.ffill().dropna()
+            # Final Cleanup (rows still missing a price are dropped with the returns)
+            prices_df = prices_df.ffill()
             
             # Ensure columns are what we expect
             if prices_df.shape[1] == 0:
@@ -440,59 +313,151 @@ class PortfolioOptimizer:
             raise
 
     def __normalize_data(self, tickers_df: pd.DataFrame) -> pd.DataFrame:
-        return tickers_df.pct_change().dropna()
+        # Daily simple returns in one NumPy pass; any row touching a missing price is dropped
+        prices = tickers_df.to_numpy(dtype=np.float64)
+        returns = prices[1:] / prices[:-1] - 1.0
+        complete = np.isfinite(returns).all(axis=1)
+        return pd.DataFrame(returns[complete], index=tickers_df.index[1:][complete], columns=tickers_df.columns)
     
-    def _minimize_risks(self, daily_reward, budget: float, allow_short=False):
+    def __frontier_terms(self) -> _FrontierTerms | None:
         """
-        Minimize portfolio variance subject to return constraint.
+        Without bounds, min w.T*Cov*w s.t. w.mu = r and sum(w) = 1 has the closed form
+        w(r) = g + h*r (Merton). Returns g, h and the Cov solves they are built from,
+        or None if Cov is singular or every asset has the same mean return.
         """
+        mu = self.mean_returns
+        ones = np.ones(self.n)
+        # Factor Cov once and back-substitute instead of forming the inverse; the tiny
+        # ridge (relative to the average variance) keeps near-singular Cov factorable
+        ridge = 1e-8 * np.trace(self.cov) / self.n
         try:
-            # Objective: Minimize Variance (w.T * Cov * w)
-            def objective(w):
-                return w @ self.cov @ w
-            
-            # Constraints
-            constraints = [
-                # Target return constraint
-                {'type': 'eq', 'fun': lambda w: np.sum(self.mean_returns * w) - daily_reward},
-                # Sum of weights = 1
-                {'type': 'eq', 'fun': lambda w: np.sum(w) - 1}
-            ]
-            
-            # Bounds
-            if allow_short:
-                bounds = [(-1.0, 1.0)] * self.n # Allow shorting up to 100%
-            else:
-                bounds = [(0.0, 1.0)] * self.n  # Long only
-            
-            w0 = np.ones(self.n) / self.n
-            
-            result = sco.minimize(objective, w0, method='SLSQP', bounds=bounds, constraints=constraints)
-            
-            weights = result.x
-            
-            # Calculate stats
-            port_variance = weights @ self.cov @ weights
-            port_return = np.sum(self.mean_returns * weights)
-            
-            results = {
-                'weights': weights,
-                'daily_variance': port_variance,
-                'daily_return': port_return,
-                'daily_std': np.sqrt(port_variance),
-                'optimization_success': result.success,
-                'message': result.message
-            }
-            
-            return results
-        except Exception as e:
-            logger.error("Error inside optimizer: %s", str(e))
-            raise
+            factor = sla.cho_factor(self.cov + ridge * np.eye(self.n))
+        except (np.linalg.LinAlgError, ValueError):
+            return None
+
+        inv_mu = sla.cho_solve(factor, mu)
+        inv_one = sla.cho_solve(factor, ones)
+        a = ones @ inv_mu
+        b = mu @ inv_mu
+        c = ones @ inv_one
+        d = b * c - a * a
+        if not np.isfinite(d) or d <= 1e-12 * abs(b * c):
+            return None
+
+        g = (b * inv_one - a * inv_mu) / d
+        h = (c * inv_mu - a * inv_one) / d
+        return _FrontierTerms(g, h, inv_mu, inv_one)
+
+    def _tangency_portfolio(self, risk_free: float, allow_short=False) -> FrontierPoint | None:
+        """
+        The max-Sharpe (tangency) portfolio in closed form:
+        w = Cov^-1 (mu - rf) / 1.T Cov^-1 (mu - rf).
+        Returns None when it isn't the answer: no closed form, the minimum-variance
+        portfolio earns less than rf (so the tangency is the *minimum* Sharpe), or
+        its weights break the solver's bounds.
+        """
+        terms = self._frontier_terms
+        if terms is None:
+            return None
+
+        excess = terms.inv_mu - risk_free * terms.inv_one
+        scale = excess.sum()
+        if not np.isfinite(scale) or scale <= 0:
+            return None
+
+        weights = excess / scale
+        lower = -1.0 if allow_short else 0.0
+        tol = 1e-10
+        if np.any(weights < lower - tol) or np.any(weights > 1.0 + tol):
+            return None
+
+        variance = float(weights @ self.cov @ weights)
+        return FrontierPoint(weights, float(weights @ self.mean_returns), variance, math.sqrt(max(variance, 0.0)), True)
+
+    def _max_sharpe(self, risk_free: float, w0: np.ndarray, allow_short=False) -> FrontierPoint | None:
+        """
+        Maximizes the Sharpe ratio directly with SLSQP under the weight bounds, for
+        when the closed-form tangency breaks them. Leveraged long/short portfolios
+        can earn more than the best single asset, so they lie beyond the target
+        range efficient_frontier scans. Returns None if the solver fails.
+        """
+        lower = -1.0 if allow_short else 0.0
+        constraints = {'type': 'eq', 'fun': _equality_gap, 'jac': _equality_gap_jac, 'args': (self._a_budget, np.ones(1))}
+        result = sco.minimize(_negative_sharpe, np.clip(w0, lower, 1.0), args=(self.mean_returns, self.cov, risk_free),
+                              method='SLSQP', jac=_negative_sharpe_grad, bounds=self._bounds[allow_short],
+                              constraints=constraints, options={'ftol': 1e-12, 'maxiter': 500})
+        if not result.success:
+            logger.warning("Max-Sharpe solve did not converge: %s", result.message)
+            return None
+
+        weights = result.x
+        variance = float(weights @ self.cov @ weights)
+        return FrontierPoint(weights, float(weights @ self.mean_returns), variance, math.sqrt(max(variance, 0.0)), True)
+
+    def _closed_form_frontier(self, target_returns: np.ndarray, allow_short=False) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Solves every frontier point at once with the closed form. Returns the
+        (n_points, n) weights and a mask of the rows that respect the bounds used by
+        _minimize_risks; the other rows need the solver.
+        """
+        if self._frontier_terms is None:
+            return np.empty((len(target_returns), self.n)), np.zeros(len(target_returns), dtype=bool)
+
+        terms = self._frontier_terms
+        weights = terms.g + np.outer(target_returns, terms.h)  # (n_points, n)
 
-    def efficient_frontier(self, budget: Decimal, n_points=50, allow_short=False):
+        lower = -1.0 if allow_short else 0.0
+        tol = 1e-10
+        feasible = np.all((weights >= lower - tol) & (weights <= 1.0 + tol), axis=1)
+        return weights, feasible
+
+    def _minimize_risks(self, daily_reward, allow_short=False, w0=None) -> FrontierPoint:
+        """
+        Minimize portfolio variance subject to return constraint.
+        `w0` warm-starts the solver, e.g. from the neighbouring frontier point.
+        """
+        cov = self.cov
+        mu = self.mean_returns
+
+        # Constraints: target return and sum of weights = 1, fused into one call
+        b_eq = np.array([daily_reward, 1.0])
+        constraints = {'type': 'eq', 'fun': _equality_gap, 'jac': _equality_gap_jac, 'args': (self._a_eq, b_eq)}
+        
+        if w0 is None:
+            w0 = np.ones(self.n) / self.n
+        
+        # Objective: Minimize Variance (w.T * Cov * w), with its exact gradient
+        result = sco.minimize(_portfolio_variance, w0, args=(cov,), method='SLSQP', jac=_portfolio_variance_grad,
+                              bounds=self._bounds[allow_short], constraints=constraints, options={'ftol': 1e-10})
+        
+        weights = result.x
+        
+        # Calculate stats (SLSQP already evaluated the variance at its final point)
+        port_variance = float(result.fun)
+        port_return = float(mu @ weights)
+        
+        return FrontierPoint(weights, port_return, port_variance, math.sqrt(max(port_variance, 0.0)), result.success)
+
+    def efficient_frontier(self, n_points=50, allow_short=False) -> Frontier:
+        key = (n_points, bool(allow_short))
+        cached = self._frontier_cache.get(key)
+        if cached is not None:
+            return cached
+
+        frontier = self.__solve_frontier(n_points, allow_short)
+        # Shared between calls, so hand out read-only arrays
+        for array in frontier:
+            array.flags.writeable = False
+        self._frontier_cache[key] = frontier
+        return frontier
+
+    def __solve_frontier(self, n_points: int, allow_short: bool) -> Frontier:
         try:
-            budget_float = float(budget)
-            
+            # A single asset has a one-point frontier: everything in that asset
+            if self.n == 1:
+                variance = self.cov[0, :1].copy()
+                return Frontier(np.ones((1, 1)), self.mean_returns.copy(), variance, np.sqrt(variance))
+
             # Get min/max returns from individual assets
             min_return = self.mean_returns.min()
             max_return = self.mean_returns.max()
@@ -502,70 +467,89 @@ class PortfolioOptimizer:
             epsilon = 1e-6
             target_returns = np.linspace(min_return + epsilon, max_return - epsilon, n_points)
             
-            frontier = []
-            
-            for target in target_returns:
-                res = self._minimize_risks(target, budget=budget_float, allow_short=allow_short)
-                if res['optimization_success']:
-                    
-                    # Convert weights array to dict
-                    weight_dict = {
-                        self.actual_tickers[i]: float(res['weights'][i]) 
-                        for i in range(self.n)
-                    }
-                    
-                    portfolio = {
-                        'target_return': res['daily_return'],
-                        'variance': res['daily_variance'],
-                        'std': res['daily_std'],
-                        'weights': weight_dict
-                    }
-                    frontier.append(portfolio)
-            
-            return frontier
+            # Most points are interior and solved analytically; only the ones that hit
+            # a bound fall back to SLSQP
+            weights, solved = self._closed_form_frontier(target_returns, allow_short=allow_short)
+            # Adjacent targets have similar optima, so each solve starts from the last one
+            w_prev = None
+            
+            for i, target in enumerate(target_returns):
+                if not solved[i]:
+                    res = self._minimize_risks(target, allow_short=allow_short, w0=w_prev)
+                    if not res.success:
+                        continue
+                    weights[i] = res.weights
+                    solved[i] = True
+                w_prev = weights[i]
+            
+            # Every metric for the whole frontier in two batched products
+            weights = weights[solved]
+            variances = np.einsum("ij,jk,ik->i", weights, self.cov, weights)
+            return Frontier(weights, weights @ self.mean_returns, variances, np.sqrt(np.maximum(variances, 0.0)))
         except Exception as e:
             logger.error("Error computing frontier: %s", str(e), exc_info=True)
             raise
 
-    def return_highest_sharpe_ratio(self, budget: Decimal, allow_short=False) -> OptimizerResult:
+    def return_highest_sharpe_ratio(self, budget: Decimal | float, allow_short=False) -> OptimizerResult:
         try:
-            ef = self.efficient_frontier(budget=budget, allow_short=allow_short)
-            
-            if not ef:
-                raise ValueError("Optimization failed to find any feasible portfolios.")
+            # Cast once; everything below works in float
+            budget = float(budget)
 
             # Annualized Risk Free Rate converted to Daily
             # 4.5% annual risk free rate (approximate current yield)
-            risk_free_daily = 0.03 / 252 
+            risk_free_daily = 0.03 / TRADING_DAYS
             
             best_portfolio = None
             max_sharpe = -float('inf')
-            
-            for port in ef:
-                rp = port['target_return']
-                sd = port['std']
+
+            # Usually the exact max-Sharpe portfolio is available in closed form
+            tangency = self._tangency_portfolio(risk_free_daily, allow_short=allow_short)
+            if tangency is not None and tangency.std > 0:
+                best_portfolio = tangency
+                max_sharpe = (tangency.target_return - risk_free_daily) / tangency.std
+            else:
+                # Otherwise search the frontier (bounds active, or no closed form)
+                ef = self.efficient_frontier(allow_short=allow_short)
                 
-                if sd > 0:
-                    sharpe = (rp - risk_free_daily) / sd
-                    if sharpe > max_sharpe:
-                        max_sharpe = sharpe
-                        best_portfolio = port
-            
-            if not best_portfolio:
-                 # Fallback to the one with max return if sharpe calcs fail
-                best_portfolio = ef[-1]
-                logger.warning("Could not calculate valid Sharpe (maybe negative returns?), returning max return portfolio.")
+                if len(ef.returns) == 0:
+                    raise ValueError("Optimization failed to find any feasible portfolios.")
+
+                # Score the whole frontier at once; zero-risk portfolios are skipped
+                valid = ef.stds > 0
+                if valid.any():
+                    sharpe = np.full(len(ef.returns), -np.inf)
+                    np.divide(ef.returns - risk_free_daily, ef.stds, out=sharpe, where=valid)
+                    best_idx = int(np.argmax(sharpe))
+                    max_sharpe = float(sharpe[best_idx])
+                    best_portfolio = ef.point(best_idx)
+                
+                if not best_portfolio:
+                     # Fallback to the one with max return if sharpe calcs fail
+                    best_portfolio = ef.point(-1)
+                    logger.warning("Could not calculate valid Sharpe (maybe negative returns?), returning max return portfolio.")
+                else:
+                    # The scan only covers targets between the worst and best asset's return;
+                    # polish its best point with a direct bounded max-Sharpe solve
+                    refined = self._max_sharpe(risk_free_daily, best_portfolio.weights, allow_short=allow_short)
+                    if refined is not None and refined.std > 0:
+                        refined_sharpe = (refined.target_return - risk_free_daily) / refined.std
+                        if refined_sharpe > max_sharpe:
+                            best_portfolio, max_sharpe = refined, refined_sharpe
 
             # Calculate Budget Allocation
-            # Clean weights (remove scientific notation near zero)
-            clean_weights = {k: (v if v > 1e-4 else 0.0) for k,v in best_portfolio['weights'].items()}
-            
-            allocation = {k: v * float(budget) for k, v in clean_weights.items() if v > 0}
-            
-            # Annualize for the final report
-            annualized_sharpe = max_sharpe * np.sqrt(252)
-            annualized_return = best_portfolio['target_return'] * 252
-            annualized_vol = best_portfolio['std'] * np.sqrt(252)
+            # Clean weights (remove scientific notation near zero); signs are kept, so
+            # short positions show up as negative weights and negative amounts
+            weights = np.where(np.abs(best_portfolio.weights) > 1e-4, best_portfolio.weights, 0.0)
+            amounts = weights * budget
+            
+            # Only the chosen portfolio's weights are ever turned into dicts
+            clean_weights = dict(zip(self.actual_tickers, weights.tolist()))
+            allocation = {k: v for k, v, w in zip(self.actual_tickers, amounts.tolist(), weights) if w != 0}
+            
+            # Annualize for the final report (volatility scales with the std, not the variance)
+            annualized_sharpe = max_sharpe * _SQRT_252
+            annualized_return = best_portfolio.target_return * TRADING_DAYS
+            annualized_vol = best_portfolio.std * _SQRT_252
 
             return OptimizerResult(
                 weights=clean_weights,
@@ -0,0 +1,20 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+# Fetches currently running, keyed by (operation, *args)
+_in_flight: dict[Hashable, asyncio.Future] = {}
+
+async def coalesce(key: Hashable, coro_factory: Callable[[], Awaitable[T]]) -> T:
+    """
+    Runs coro_factory() once per key at a time: concurrent callers with the same
+    key await the same task instead of issuing duplicate upstream requests.
+    """
+    future = _in_flight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(coro_factory())
+        _in_flight[key] = future
+        future.add_done_callback(lambda _: _in_flight.pop(key, None))
+    # Shield so one cancelled caller doesn't cancel the fetch for the others
+    return await asyncio.shield(future)
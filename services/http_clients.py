@@ -0,0 +1,31 @@
+import functools
+import httpx
+
+HTTP_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=100)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+@functools.cache
+def get_http_client() -> httpx.Client:
+    """
+    Process-wide HTTP/2 pool shared by every sync OpenAI client.
+    """
+    return httpx.Client(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+
+@functools.cache
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Process-wide HTTP/2 pool shared by every async OpenAI client, so the agents
+    reuse the same TCP/TLS connections to the API.
+    """
+    return httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+
+async def close_http_clients() -> None:
+    """
+    Closes the shared pools (e.g. on app shutdown). They are recreated on next use.
+    """
+    if get_async_http_client.cache_info().currsize:
+        await get_async_http_client().aclose()
+        get_async_http_client.cache_clear()
+    if get_http_client.cache_info().currsize:
+        get_http_client().close()
+        get_http_client.cache_clear()
@@ -0,0 +1,211 @@
+import os
+import asyncio
+import logging
+import threading
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from cachetools import TTLCache
+import yfinance as yf
+from yfinance.data import YfData
+from services.yf_session import yf_session
+from services.coalesce import coalesce
+
+logger = logging.getLogger(__name__)
+
+# Lookups arriving within BATCH_WINDOW seconds of each other are resolved together
+BATCH_SIZE = 20
+BATCH_WINDOW = 0.05
+
+# Cached payloads are shared between callers, so treat them as read-only.
+# .info barely moves intraday, so repeat lookups are served from memory for a while
+_info_cache: TTLCache = TTLCache(
+    maxsize=int(os.environ.get("YF_INFO_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("YF_INFO_CACHE_TTL", "900")),
+)
+# Screener hits are stable for minutes, so identical queries reuse the last result.
+# screen() runs on the Yahoo pool, so this one is guarded by a lock
+_screen_cache: TTLCache = TTLCache(
+    maxsize=int(os.environ.get("YF_SCREEN_CACHE_SIZE", "256")),
+    ttl=float(os.environ.get("YF_SCREEN_CACHE_TTL", "300")),
+)
+_screen_cache_lock = threading.Lock()
+# Quotes move intraday, so they are only reused for a short window
+_quote_cache: TTLCache = TTLCache(
+    maxsize=int(os.environ.get("YF_QUOTE_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("YF_QUOTE_CACHE_TTL", "60")),
+)
+
+# Yahoo calls block on network I/O, so they run on their own pool rather than the
+# default executor (min(32, cpu + 4) threads), which other to_thread users share
+_yf_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("YF_MAX_WORKERS", "64")),
+    thread_name_prefix="yf",
+)
+# Upper bound on how long a caller waits for one Yahoo request
+YF_CALL_TIMEOUT = float(os.environ.get("YF_CALL_TIMEOUT", "5"))
+# yf.screen returns up to 250 quotes and can sleep in the session's rate limiter
+# once the per-minute window fills, so it gets a much longer bound
+YF_SCREEN_TIMEOUT = float(os.environ.get("YF_SCREEN_TIMEOUT", "60"))
+
+async def run_in_pool(func, *args, timeout: Optional[float] = YF_CALL_TIMEOUT):
+    """
+    Runs a blocking yfinance call on the Yahoo pool. With a timeout, a slow
+    request raises TimeoutError instead of holding up the caller.
+    """
+    future = asyncio.get_running_loop().run_in_executor(_yf_executor, func, *args)
+    return await asyncio.wait_for(future, timeout)
+
+def _fetch_infos(symbols: list[str]) -> dict[str, dict | Exception]:
+    """
+    Resolves `.info` for a batch of symbols through one shared yf.Tickers object.
+    Failures are returned per symbol so one bad ticker does not fail the batch.
+    """
+    tickers = yf.Tickers(" ".join(symbols), session=yf_session)
+    results = {}
+    for symbol in symbols:
+        try:
+            results[symbol] = tickers.tickers[symbol.upper()].info
+        except Exception as e:
+            results[symbol] = e
+    return results
+
+class InfoBatcher:
+    """
+    Coalesces concurrent `.info` lookups: callers enqueue a ticker and await a
+    future, while a background task drains the queue in batches of up to
+    BATCH_SIZE (or whatever arrived within BATCH_WINDOW). Duplicate tickers in
+    a batch are only looked up once.
+    """
+    def __init__(self, batch_size: int = BATCH_SIZE, window: float = BATCH_WINDOW) -> None:
+        self.batch_size = batch_size
+        self.window = window
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def get_info(self, ticker: str) -> dict:
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((ticker, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except TimeoutError:
+                    break
+            # Dispatch without waiting, so the next batch can start collecting
+            loop.create_task(self._dispatch(batch))
+
+    @staticmethod
+    async def _dispatch(batch: list[tuple[str, asyncio.Future]]) -> None:
+        symbols = list(dict.fromkeys(ticker for ticker, _ in batch))
+        try:
+            # A batch resolves up to BATCH_SIZE tickers one after another, so no per-call timeout
+            results = await run_in_pool(_fetch_infos, symbols, timeout=None)
+        except Exception as e:
+            results = {symbol: e for symbol in symbols}
+        for ticker, future in batch:
+            if future.done():
+                continue
+            result = results[ticker]
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+_batcher = InfoBatcher()
+
+QUOTE_URL = "https://query1.finance.yahoo.com/v7/finance/quote"
+QUOTE_BATCH_SIZE = 10
+# Only ask for what the callers read, instead of the ~80 fields Yahoo returns by default
+QUOTE_FIELDS = ",".join((
+    "symbol", "shortName", "regularMarketPrice",
+    "regularMarketPreviousClose", "trailingPE", "marketCap",
+))
+
+def _fetch_quote_chunk(symbols: list[str]) -> list[dict]:
+    # YfData handles the cookie/crumb handshake once per process
+    params = {"symbols": ",".join(symbols), "fields": QUOTE_FIELDS, "formatted": "false"}
+    data = YfData(session=yf_session).get_raw_json(QUOTE_URL, params=params)
+    return data["quoteResponse"]["result"]
+
+async def get_quotes(symbols: list[str]) -> dict[str, dict]:
+    """
+    Fetches quotes for many symbols through Yahoo's multi-symbol quote endpoint,
+    QUOTE_BATCH_SIZE symbols per request, with the requests issued concurrently.
+    Recently fetched quotes come from a short TTL cache, and identical concurrent
+    fetches are coalesced. Returns {symbol: quote}; symbols in a failed batch are left out.
+    """
+    quotes = {}
+    misses = []
+    for symbol in symbols:
+        cached = _quote_cache.get(symbol)
+        if cached is not None:
+            quotes[symbol] = cached
+        else:
+            misses.append(symbol)
+    if misses:
+        fetched = await coalesce(("quotes", tuple(misses)), lambda: _fetch_quotes(misses))
+        quotes.update(fetched)
+    return quotes
+
+async def _fetch_quotes(symbols: list[str]) -> dict[str, dict]:
+    chunks = [symbols[i:i + QUOTE_BATCH_SIZE] for i in range(0, len(symbols), QUOTE_BATCH_SIZE)]
+    results = await asyncio.gather(
+        *(run_in_pool(_fetch_quote_chunk, chunk) for chunk in chunks),
+        return_exceptions=True,
+    )
+    quotes = {}
+    for chunk, result in zip(chunks, results):
+        if isinstance(result, Exception):
+            logger.warning("Failed to fetch quotes for %s: %s", chunk, result)
+            continue
+        for quote in result:
+            quotes[quote["symbol"]] = quote
+            _quote_cache[quote["symbol"]] = quote
+    return quotes
+
+async def get_info(ticker: str) -> dict:
+    """
+    Returns yfinance `.info` for a ticker, from the cache or batched with any
+    concurrent lookups.
+    """
+    key = ticker.upper()
+    cached = _info_cache.get(key)
+    if cached is not None:
+        return cached
+    info = await coalesce(("info", key), lambda: _batcher.get_info(ticker))
+    _info_cache[key] = info
+    return info
+
+def screen(query, count: int = 250) -> dict:
+    """
+    Runs yf.screen on the shared session, serving repeats of the same query from
+    a TTL cache instead of re-hitting Yahoo.
+    """
+    key = (orjson.dumps(query.to_dict(), option=orjson.OPT_SORT_KEYS, default=str), count)
+    with _screen_cache_lock:
+        cached = _screen_cache.get(key)
+    if cached is not None:
+        return cached
+    result = yf.screen(query, count=count, session=yf_session)
+    with _screen_cache_lock:
+        _screen_cache[key] = result
+    return result
@@ -0,0 +1,52 @@
+import os
+import time
+import threading
+from collections import deque
+from curl_cffi import requests as curl_requests
+
+class RateLimiter:
+    """
+    Thread-safe sliding-window limiter. Each (max_calls, period) rate is enforced
+    independently; acquire() blocks until every window has room for one more call.
+    """
+    def __init__(self, *rates: tuple[int, float]) -> None:
+        self._windows = [(max_calls, period, deque()) for max_calls, period in rates]
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = 0.0
+                for max_calls, period, calls in self._windows:
+                    while calls and calls[0] <= now - period:
+                        calls.popleft()
+                    if len(calls) >= max_calls:
+                        wait = max(wait, calls[0] + period - now)
+                if wait <= 0:
+                    for _, _, calls in self._windows:
+                        calls.append(now)
+                    return
+            time.sleep(wait)
+
+class LimiterSession(curl_requests.Session):
+    """
+    curl_cffi session (yfinance rejects plain requests / requests_cache sessions)
+    that passes every request through a shared RateLimiter.
+    """
+    def __init__(self, limiter: RateLimiter, **kwargs) -> None:
+        kwargs.setdefault("impersonate", "chrome")
+        super().__init__(**kwargs)
+        self.limiter = limiter
+
+    def request(self, *args, **kwargs):
+        self.limiter.acquire()
+        return super().request(*args, **kwargs)
+
+# One session for every yfinance call in the process, so cookies/crumb and connections are shared
+yf_session = LimiterSession(
+    RateLimiter(
+        (int(os.environ.get("YF_REQUESTS_PER_MINUTE", "60")), 60.0),
+        (int(os.environ.get("YF_REQUESTS_PER_DAY", "8000")), 86400.0),
+    )
+)
@@ -0,0 +1,85 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import optimizers.allocation_optimizer as ao
+
+RISK_FREE_DAILY = 0.03 / ao.TRADING_DAYS
+
+
+def synthetic_download(drift):
+    """A yf.download stand-in returning a year of seeded Close prices."""
+    def download(tickers, **kwargs):
+        rng = np.random.default_rng(7)
+        index = pd.bdate_range("2025-01-01", periods=252)
+        k = len(tickers)
+        returns = (np.linspace(*drift, k) + rng.normal(0, 0.008, (252, 1))
+                   + rng.normal(0, 1, (252, k)) * np.linspace(0.01, 0.03, k))
+        columns = pd.MultiIndex.from_product([["Close"], tickers])
+        return pd.DataFrame(100 * np.cumprod(1 + returns, axis=0), index=index, columns=columns)
+    return download
+
+
+def brute_force_sharpe(optimizer, allow_short, step=0.01):
+    """Best annualized Sharpe over a weight grid for three assets (weights sum to 1)."""
+    lower = -1.0 if allow_short else 0.0
+    grid = np.arange(lower, 1.0 + 1e-9, step)
+    w1, w2 = (a.ravel() for a in np.meshgrid(grid, grid))
+    w3 = 1.0 - w1 - w2
+    feasible = (w3 >= lower - 1e-9) & (w3 <= 1.0 + 1e-9)
+    weights = np.stack([w1, w2, w3], axis=1)[feasible]
+    excess = weights @ optimizer.mean_returns - RISK_FREE_DAILY
+    stds = np.sqrt(np.einsum("ij,jk,ik->i", weights, optimizer.cov, weights))
+    return float(np.max(excess / stds)) * np.sqrt(ao.TRADING_DAYS)
+
+
+class MaxSharpeTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patches = [
+            mock.patch.object(ao, "PRICE_CACHE_DIR", Path(cache_dir.name)),
+            mock.patch.object(ao.yf, "download"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        ao._download_prices.cache_clear()
+        self.addCleanup(ao._download_prices.cache_clear)
+
+    def optimizer(self, drift):
+        ao.yf.download.side_effect = synthetic_download(drift)
+        return ao.PortfolioOptimizer(["P", "Q", "R"], ao.StockMarket.US)
+
+    def test_matches_brute_force_optimum(self):
+        # Includes cases where the unconstrained tangency breaks the bounds and the
+        # best long/short mix earns more than any single asset
+        for drift in ((0.0002, 0.0015), (0.0012, 0.002), (-0.001, 0.002), (0.001, -0.002)):
+            optimizer = self.optimizer(drift)
+            for allow_short in (False, True):
+                with self.subTest(drift=drift, allow_short=allow_short):
+                    result = optimizer.return_highest_sharpe_ratio(budget=1000, allow_short=allow_short)
+                    self.assertGreaterEqual(result.sharpe_ratio, brute_force_sharpe(optimizer, allow_short) - 1e-3)
+
+    def test_short_positions_are_reported(self):
+        optimizer = self.optimizer((-0.001, 0.002))
+        result = optimizer.return_highest_sharpe_ratio(budget=1000, allow_short=True)
+
+        weights = np.array([result.weights[ticker] for ticker in optimizer.actual_tickers])
+        self.assertLess(weights.min(), 0)
+        self.assertAlmostEqual(weights.sum(), 1.0, places=3)
+        self.assertAlmostEqual(sum(result.budget_allocation.values()), 1000, delta=1)
+        self.assertTrue(any(amount < 0 for amount in result.budget_allocation.values()))
+
+        # The reported figures describe the weights that were returned
+        std = np.sqrt(weights @ optimizer.cov @ weights)
+        sharpe = (weights @ optimizer.mean_returns - RISK_FREE_DAILY) / std * np.sqrt(ao.TRADING_DAYS)
+        self.assertAlmostEqual(result.sharpe_ratio, sharpe, places=2)
+
+
+if __name__ == "__main__":
+    unittest.main()